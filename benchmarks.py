@@ -0,0 +1,141 @@
+# coding: utf-8
+"""
+Micro benchmarks for the extensions, run them with ``python benchmarks.py``.
+"""
+from __future__ import print_function, unicode_literals
+
+import timeit
+
+from jinja2 import DictLoader, Environment
+
+from jdj_tags.extensions import DjangoI18n, DjangoL10n, DjangoStatic, DjangoUrl
+from jdj_tags.msgids import PreloadedTranslations, extract
+from jdj_tags.staticfiles import CachedStatic
+from jdj_tags.urlresolvers import CachedReverse
+
+try:
+    from django.urls import re_path as url
+except ImportError:
+    from django.conf.urls import url
+
+NUMBER = 5000
+
+
+def dummy_view(request, *args, **kwargs):
+    pass
+
+
+urlpatterns = [
+    url(r'^$', dummy_view, name='home'),
+    url(r'^item/(?P<pk>\d+)/$', dummy_view, name='item'),
+]
+
+
+def report(name, seconds, number=NUMBER):
+    print('{:<50} {:>10.2f} us'.format(name, seconds / number * 1e6))
+
+
+def loop(source, times=10):
+    return '{% for i in range(' + str(times) + ') %}' + source + '{% endfor %}'
+
+
+def bench_render(name, env, source, context=None, number=NUMBER):
+    template = env.from_string(source)
+    context = context or {}
+    template.render(context)
+    report(name, min(timeit.repeat(lambda: template.render(context), number=number, repeat=3)),
+           number)
+
+
+def bench_blocktrans():
+    env = Environment(extensions=[DjangoI18n])
+    bench_render(
+        'blocktrans without variables (x10)',
+        env, loop('{% blocktrans %}Hello World{% endblocktrans %}')
+    )
+    bench_render(
+        'blocktrans with constant variable (x10)',
+        env, loop('{% blocktrans with a=1 %}Hello World{% endblocktrans %}')
+    )
+    bench_render(
+        'trans (x10)',
+        env, loop("{% trans 'Hello World' %}")
+    )
+
+
+def bench_tags():
+    env = Environment(extensions=[DjangoStatic, DjangoUrl])
+    bench_render('static (x10)', env, loop("{% static 'css/site.css' %}"))
+    env.static_backend = CachedStatic()
+    bench_render('static with CachedStatic (x10)', env, loop("{% static 'css/site.css' %}"))
+    env.static_backend = CachedStatic(hosts=['https://s1.example', 'https://s2.example'])
+    bench_render('static with 2 hosts (x10)', env, loop("{% static 'css/site.css' %}"))
+    env.static_backend = None
+    bench_render('url (x10)', env, loop("{% url 'home' %}"))
+    bench_render('url with kwargs (x10)', env, loop("{% url 'item' pk=i %}"))
+
+    env = Environment(extensions=[DjangoUrl])
+    env.render_url_cache = False
+    bench_render('url without render cache (x10)', env, loop("{% url 'item' pk=i %}"))
+    env.url_reverse_backend = CachedReverse()
+    bench_render('url with CachedReverse (x10)', env, loop("{% url 'item' pk=i %}"))
+
+
+def bench_parse():
+    env = Environment(extensions=[DjangoI18n, DjangoUrl])
+    blocktrans = (
+        "{% blocktrans trimmed with name=user.name count counter=items|length %}\n"
+        "    Hello {{ name }},\n    you have {{ counter }} item.\n"
+        "{% plural %}\n"
+        "    Hello {{ name }},\n    you have {{ counter }} items.\n"
+        "{% endblocktrans %}\n"
+    ) * 10000
+    urls = "{% url 'my_view' 'foo' arg.bar 12 %}{% url 'my_view' kw1='foo' kw2=arg.bar %}\n" * 5000
+
+    for name, source in [('blocktrans', blocktrans), ('url', urls)]:
+        seconds = min(timeit.repeat(lambda: env.parse(source), number=1, repeat=3))
+        report('parse 10000 {} tags'.format(name), seconds, 1)
+
+
+def bench_localize():
+    from django.utils import translation
+    translation.activate('de')
+    env = Environment(extensions=[DjangoL10n])
+    context = {'column': [i * 1.5 for i in range(10000)]}
+    bench_render(
+        'localize 10000 floats with finalize', env,
+        '{% for v in column %}{{ v }}{% endfor %}', context, number=10
+    )
+    bench_render(
+        'localize 10000 floats with localize_many', env,
+        '{% for v in column|localize_many %}{{ v }}{% endfor %}', context, number=10
+    )
+
+
+def bench_preload():
+    from django.utils import translation
+    translation.activate('de')
+    source = loop("{% trans 'Monday' %}{% blocktrans %}Tuesday{% endblocktrans %}")
+    env = Environment(extensions=[DjangoI18n], loader=DictLoader({'a.html': source}))
+    bench_render('trans and blocktrans (x10)', env, source)
+    PreloadedTranslations(extract(env)).install(env)
+    bench_render('trans and blocktrans, preloaded (x10)', env, source)
+
+
+BENCHMARKS = [
+    bench_blocktrans,
+    bench_tags,
+    bench_parse,
+    bench_localize,
+    bench_preload,
+]
+
+
+if __name__ == '__main__':
+    from django.apps import apps
+    from django.conf import settings
+    settings.configure(ROOT_URLCONF=__name__, STATIC_URL='/static/', USE_L10N=True)
+    apps.populate(settings.INSTALLED_APPS)
+
+    for benchmark in BENCHMARKS:
+        benchmark()
@@ -0,0 +1,127 @@
+"""
+Django template backend for jinja2 with the django tags enabled.
+"""
+from __future__ import unicode_literals
+
+import hashlib
+import inspect
+
+from django.template.backends.jinja2 import Jinja2 as BaseJinja2
+from django.utils.module_loading import import_string
+from jinja2 import FileSystemBytecodeCache
+
+from jdj_tags import extensions as jdj_extensions
+from jdj_tags.extensions import DjangoCompat
+from jdj_tags.stats import TranslationStats
+
+try:
+    string_types = basestring  # noqa
+except NameError:  # Python 3
+    string_types = str
+
+
+class Jinja2(BaseJinja2):
+    """
+    Works like django's jinja2 backend, but adds
+    `jdj_tags.extensions.DjangoCompat` to the extensions unless one of the
+    extensions of this library is configured already::
+
+        TEMPLATES = [
+            {
+                'BACKEND': 'jdj_tags.backend.Jinja2',
+                'DIRS': [],
+                'APP_DIRS': True,
+                'OPTIONS': {
+                    'strict_urls': True,
+                },
+            },
+        ]
+
+    Besides the options of django's backend and of `jinja2.Environment` the
+    following options are supported:
+
+    `bytecode_cache`
+        A `jinja2.BytecodeCache`, the path of a directory for a
+        `jinja2.FileSystemBytecodeCache` or ``True`` for one in the system's
+        temporary directory. Disabled by default. Jinja only checks the
+        template source and its own version before it loads cached bytecode,
+        so the files of the caches created from a path or ``True`` are named
+        after this library's code and the configured extensions and
+        `strict_urls`. `strict_urls` only checks templates when they are
+        compiled, not when they are loaded from the cache.
+
+    `strict_urls`, `render_url_cache`
+        Set the environment attributes of the same name, see
+        `jdj_tags.extensions.DjangoUrl`.
+
+    `url_reverse_backend`, `static_backend`
+        A reverse or static backend or the dotted path of its class, which
+        is instantiated without arguments, e.g.
+        ``'jdj_tags.urlresolvers.CachedReverse'``, see
+        `jdj_tags.urlresolvers` and `jdj_tags.staticfiles`.
+
+    `translation_stats`
+        If set, a `jdj_tags.stats.TranslationStats` is installed on the
+        environment, it is available as ``env.translation_stats``.
+
+    As with django's backend, `auto_reload` defaults to `DEBUG` and the
+    context of templates rendered with a request contains `request`,
+    `csrf_input` and `csrf_token`, which `{% csrf_token %}` uses.
+    """
+    environment_attributes = (
+        'strict_urls', 'render_url_cache', 'url_reverse_backend', 'static_backend',
+    )
+    # attributes that may be given as the dotted path of a class
+    backend_attributes = ('url_reverse_backend', 'static_backend')
+
+    def __init__(self, params):
+        params = params.copy()
+        options = params['OPTIONS'] = params.get('OPTIONS', {}).copy()
+
+        extensions = list(options.get('extensions', ()))
+        if not any(self._is_jdj_extension(ext) for ext in extensions):
+            extensions.insert(0, DjangoCompat)
+        options['extensions'] = extensions
+
+        bytecode_cache = options.pop('bytecode_cache', None)
+
+        translation_stats = options.pop('translation_stats', False)
+        attributes = {
+            name: options.pop(name)
+            for name in self.environment_attributes if name in options
+        }
+        for name in self.backend_attributes:
+            if isinstance(attributes.get(name), string_types):
+                attributes[name] = import_string(attributes[name])()
+
+        super(Jinja2, self).__init__(params)
+
+        for name, value in attributes.items():
+            setattr(self.env, name, value)
+        if bytecode_cache is True:
+            bytecode_cache = FileSystemBytecodeCache(pattern=self._bytecode_cache_pattern())
+        elif isinstance(bytecode_cache, string_types):
+            bytecode_cache = FileSystemBytecodeCache(
+                bytecode_cache, self._bytecode_cache_pattern()
+            )
+        self.env.bytecode_cache = bytecode_cache
+        if translation_stats:
+            TranslationStats().install(self.env)
+
+    def _bytecode_cache_pattern(self):
+        # The code compiled for the tags depends on the extensions module and
+        # the configuration, environments that differ in them don't share
+        # cache files.
+        try:
+            source = inspect.getsource(jdj_extensions)
+        except (IOError, OSError):  # pragma: no cover
+            source = ''
+        key = repr((source, sorted(self.env.extensions), getattr(self.env, 'strict_urls', False)))
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return '__jinja2_jdj_tags_{}_%s.cache'.format(digest)
+
+    @staticmethod
+    def _is_jdj_extension(extension):
+        if isinstance(extension, string_types):
+            return extension.startswith('jdj_tags.')
+        return getattr(extension, '__module__', '').startswith('jdj_tags.')
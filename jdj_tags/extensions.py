@@ -3,21 +3,254 @@ jinja2 extensions that add django tags.
 """
 from __future__ import unicode_literals
 
-from datetime import datetime
+from datetime import date, datetime, time
+from decimal import Decimal
 
 from django.conf import settings
 from django.templatetags.static import static as django_static
+from django.utils import dateformat, numberformat
 from django.utils.encoding import force_text
-from django.utils.formats import date_format, localize
-from django.utils.timezone import get_current_timezone, template_localtime
-from django.utils.translation import npgettext, pgettext, ugettext, ungettext
+from django.utils.formats import date_format, get_format, localize
+from django.utils.timezone import (get_current_timezone, is_naive, localtime,
+                                   template_localtime)
+from django.utils.translation import get_language, npgettext, pgettext, ugettext, ungettext
 from jinja2 import lexer, nodes
+from jinja2.environment import TemplateModule
 from jinja2.ext import Extension
 
 try:
-    from django.urls import reverse
+    from jinja2 import pass_context
+except ImportError:  # Jinja2 < 3.0
+    from jinja2 import contextfilter, contextfunction
+
+    def pass_context(func):
+        # marks func for use as a filter as well as a function
+        return contextfilter(contextfunction(func))
+
+try:
+    from django.urls import get_resolver, get_urlconf, reverse
 except:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import get_resolver, get_urlconf, reverse
+
+try:
+    _number_types = (Decimal, float, int, long)  # noqa
+    _string_types = basestring  # noqa
+except NameError:  # Python 3
+    _number_types = (Decimal, float, int)
+    _string_types = str
+
+try:
+    from sys import intern as _sys_intern
+except ImportError:  # Python 2
+    def _intern(string):
+        return string
+else:
+    def _intern(string):
+        # sys.intern() rejects subclasses of str (e.g. SafeText), slicing
+        # returns an exact copy of them.
+        return _sys_intern(string if type(string) is str else string[:])
+
+
+def _url_key(name, args, kwargs):
+    # Equal arguments of different types, e.g. 1, 1.0 and True, reverse to
+    # different urls, so their types are part of the key.
+    return (
+        name,
+        tuple((type(arg), arg) for arg in args),
+        tuple(sorted((key, type(value), value) for key, value in kwargs.items())),
+    )
+
+
+class RenderState(object):
+    """
+    Snapshot of the django settings and thread-local state the tags depend
+    on. Every render creates one in the context of the rendered template
+    (see :func:`_use_render_state`), so included templates, macros and
+    blocks share it. The snapshot is taken when a tag first needs it.
+
+    Changing the active language or timezone while a template renders
+    doesn't affect the tags that already have a snapshot.
+
+    Jinja keeps the module of a template that is imported without context
+    and calls its macros with the module's context in later renders. That
+    context is marked as ended and gets a new snapshot for every tag.
+    """
+    context_key = '_django_render_state'
+    ended_key = '_django_render_ended'
+
+    def __init__(self):
+        self.urls = {}
+        self.localizer = None
+
+    def __getattr__(self, name):
+        # only called while the snapshot hasn't been taken
+        if name not in ('use_tz', 'use_l10n', 'language', 'timezone'):
+            raise AttributeError(name)
+        self.use_tz = settings.USE_TZ
+        self.use_l10n = settings.USE_L10N
+        self.language = get_language()
+        self.timezone = get_current_timezone() if self.use_tz else None
+        return getattr(self, name)
+
+    @classmethod
+    def of(cls, context):
+        state = context.get(cls.context_key)
+        if state is None:
+            state = cls()
+            if not context.vars.get(cls.ended_key):
+                context.vars[cls.context_key] = state
+        return state
+
+
+class _RenderStateTemplate(object):
+    # Mixed into the template class of the environment. A render starts with
+    # new_context(), templates included with context get the variables of
+    # the including one and therefore share its state.
+
+    def new_context(self, vars=None, shared=False, locals=None):
+        context = super(_RenderStateTemplate, self).new_context(vars, shared, locals)
+        if context.get(RenderState.context_key) is None:
+            context.vars[RenderState.context_key] = RenderState()
+        return context
+
+    def make_module(self, vars=None, shared=False, locals=None):
+        # Template.make_module(), but the context ends with the module's body
+        context = self.new_context(vars, shared, locals)
+        module = TemplateModule(self, context)
+        context.vars.pop(RenderState.context_key, None)
+        context.vars[RenderState.ended_key] = True
+        return module
+
+
+def _use_render_state(environment):
+    # Makes the templates of the environment create a RenderState per render.
+    template_class = environment.template_class
+    if not issubclass(template_class, _RenderStateTemplate):
+        environment.template_class = type(
+            str(template_class.__name__), (_RenderStateTemplate, template_class), {}
+        )
+
+
+def _call_helper(name, args, kwargs=None, lineno=None):
+    # The extensions register their runtime helpers as globals. Unlike
+    # Extension.call_method() the compiled template then resolves a helper
+    # once per render instead of looking up the extension on every call.
+    # Environment.overlay() shares the globals, so the helpers read the
+    # environment of the render from the context, not from an extension.
+    func = nodes.Name(name, 'load', lineno=lineno)
+    return nodes.Call(func, args, kwargs or [], None, None, lineno=lineno)
+
+
+def _csrf_token(csrf_token):
+    if not csrf_token or csrf_token == 'NOTPROVIDED':
+        return ''
+    else:
+        return '<input type="hidden" name="csrfmiddlewaretoken" value="{}" />' \
+               .format(csrf_token)
+
+
+@pass_context
+def _trans(template_context, message, context=None, noop=False):
+    # The gettext functions are resolved like a {{ gettext() }} call, so
+    # wrapping their globals covers the tags too.
+    if noop:
+        return message
+    if context is None:
+        return template_context.resolve('gettext')(message)
+    return template_context.resolve('pgettext')(context, message)
+
+
+@pass_context
+def _blocktrans_plain(template_context, message, context=None):
+    # Nothing to interpolate, so this is translated like {% trans %}.
+    # Django writes "%" as "%%" in blocktrans msgids and formats every
+    # translation, which for these only turns "%%" back into "%".
+    translated = _trans(template_context, message, context)
+    if '%' in message:
+        translated = translated.replace('%%', '%')
+    return translated
+
+
+@pass_context
+def _blocktrans(template_context, singular, plural=None, context=None, trans_vars=None,
+                count_var=None):
+    if trans_vars is None:
+        trans_vars = {}  # pragma: no cover
+    environment = template_context.environment
+    if environment.finalize:
+        finalized_trans_vars = {
+            key: environment.finalize(val) for key, val in trans_vars.items()
+        }
+    else:
+        finalized_trans_vars = trans_vars
+    helpers = environment.globals
+    if plural is None:
+        if context is None:
+            return helpers['gettext'](force_text(singular)) % finalized_trans_vars
+        else:
+            return helpers['pgettext'](
+                force_text(context), force_text(singular)
+            ) % finalized_trans_vars
+    else:
+        if context is None:
+            return helpers['ngettext'](
+                force_text(singular), force_text(plural), trans_vars[count_var]
+            ) % finalized_trans_vars
+        else:
+            return helpers['npgettext'](
+                force_text(context), force_text(singular), force_text(plural),
+                trans_vars[count_var]
+            ) % finalized_trans_vars
+
+
+@pass_context
+def _static(context, path):
+    environment = context.environment
+    table = environment.precomputed_urls
+    if table is not None:
+        url = table.static(path)
+        if url is not None:
+            return url
+    backend = environment.static_backend
+    if backend is None:
+        return django_static(path)
+    return backend.url(path)
+
+
+@pass_context
+def _now(context, format_string):
+    cur_datetime = datetime.now(tz=RenderState.of(context).timezone)
+    return date_format(cur_datetime, format_string)
+
+
+@pass_context
+def _url(context, name, args, kwargs):
+    environment = context.environment
+    table = environment.precomputed_urls
+    if table is not None:
+        url = table.reverse(name, args, kwargs)
+        if url is not None:
+            return url
+    if not environment.render_url_cache:
+        return _reverse(environment, name, args, kwargs)
+
+    urls = RenderState.of(context).urls
+    try:
+        key = _url_key(name, args, kwargs)
+        return urls[key]
+    except KeyError:
+        url = urls[key] = _reverse(environment, name, args, kwargs)
+        return url
+    except TypeError:
+        # unhashable argument
+        return _reverse(environment, name, args, kwargs)
+
+
+def _reverse(environment, name, args, kwargs):
+    backend = environment.url_reverse_backend
+    if backend is None:
+        return reverse(name, args=args, kwargs=kwargs)
+    return backend.reverse(name, args, kwargs)
 
 
 class DjangoCsrf(Extension):
@@ -26,22 +259,19 @@ class DjangoCsrf(Extension):
     """
     tags = set(['csrf_token'])
 
+    def __init__(self, environment):
+        super(DjangoCsrf, self).__init__(environment)
+        environment.globals['_django_csrf_token'] = _csrf_token
+
     def parse(self, parser):
         lineno = parser.stream.expect('name:csrf_token').lineno
-        call = self.call_method(
-            '_csrf_token',
+        call = _call_helper(
+            '_django_csrf_token',
             [nodes.Name('csrf_token', 'load', lineno=lineno)],
             lineno=lineno
         )
         return nodes.Output([nodes.MarkSafe(call)])
 
-    def _csrf_token(self, csrf_token):
-        if not csrf_token or csrf_token == 'NOTPROVIDED':
-            return ''
-        else:
-            return '<input type="hidden" name="csrfmiddlewaretoken" value="{}" />' \
-                   .format(csrf_token)
-
 
 class DjangoI18n(Extension):
     """
@@ -79,12 +309,16 @@ class DjangoI18n(Extension):
         {% endblocktrans %}
         Translated text: {{ translated_var }}
 
-    You also can use `_`, `gettext` and `pgettext` directly::
+    You also can use `_`, `gettext`, `pgettext`, `ngettext` and `npgettext`
+    directly::
 
         Simple example: {{ _('Hello World') }}
         More verbose: {{ gettext('Hello World') }}
         With context: {{ pgettext('Hello World', 'another example') }}
+        Plural: {{ ngettext('%(n)s item', '%(n)s items', n)|format(n=n) }}
 
+    All translations of the tags are looked up through these globals, so
+    wrapping them (see `jdj_tags.stats.TranslationStats`) covers the tags too.
     """
     tags = set(['trans', 'blocktrans'])
 
@@ -93,10 +327,15 @@ class DjangoI18n(Extension):
         environment.globals['_'] = ugettext
         environment.globals['gettext'] = ugettext
         environment.globals['pgettext'] = pgettext
+        environment.globals['ngettext'] = ungettext
+        environment.globals['npgettext'] = npgettext
+        environment.globals['_django_trans'] = _trans
+        environment.globals['_django_blocktrans'] = _blocktrans
+        environment.globals['_django_blocktrans_plain'] = _blocktrans_plain
 
     def _parse_trans(self, parser, lineno):
         string = parser.stream.expect(lexer.TOKEN_STRING)
-        string = nodes.Const(string.value, lineno=string.lineno)
+        string = nodes.Const(_intern(string.value), lineno=string.lineno)
         is_noop = False
         context = None
         as_var = None
@@ -109,88 +348,126 @@ class DjangoI18n(Extension):
                 if is_noop:
                     parser.fail("noop translation can't have context", lineno=token.lineno)
                 context = parser.stream.expect(lexer.TOKEN_STRING)
-                context = nodes.Const(context.value, lineno=context.lineno)
+                context = nodes.Const(_intern(context.value), lineno=context.lineno)
             elif token.value == 'as' and as_var is None:
                 as_var = parser.stream.expect(lexer.TOKEN_NAME)
                 as_var = nodes.Name(as_var.value, 'store', lineno=as_var.lineno)
             else:
                 parser.fail("expected 'noop', 'context' or 'as'", lineno=token.lineno)
+        kwargs = []
         if is_noop:
-            output = string
+            kwargs.append(nodes.Keyword('noop', nodes.Const(True), lineno=lineno))
         elif context is not None:
-            func = nodes.Name('pgettext', 'load', lineno=lineno)
-            output = nodes.Call(func, [context, string], [], None, None, lineno=lineno)
-        else:
-            func = nodes.Name('gettext', 'load')
-            output = nodes.Call(func, [string], [], None, None, lineno=lineno)
+            kwargs.append(nodes.Keyword('context', context, lineno=lineno))
+        output = _call_helper('_django_trans', [string], kwargs, lineno=lineno)
 
         if as_var is None:
             return nodes.Output([output], lineno=lineno)
         else:
             return nodes.Assign(as_var, output, lineno=lineno)
 
+    @staticmethod
+    def _join_body(body, trimmed):
+        body = ''.join(body)
+        if trimmed:
+            body = ' '.join([line.strip() for line in body.strip().splitlines()])
+        return _intern(body)
+
     def _parse_blocktrans(self, parser, lineno):
+        stream = parser.stream
         with_vars = {}
         count = None
         context = None
         trimmed = False
         as_var = None
 
-        if parser.stream.skip_if('name:trimmed'):
+        if stream.skip_if('name:trimmed'):
             trimmed = True
 
-        if parser.stream.skip_if('name:asvar'):
-            as_var = parser.stream.expect(lexer.TOKEN_NAME)
+        if stream.skip_if('name:asvar'):
+            as_var = stream.expect(lexer.TOKEN_NAME)
             as_var = nodes.Name(as_var.value, 'store', lineno=as_var.lineno)
 
-        if parser.stream.skip_if('name:with'):
-            while parser.stream.look().type == lexer.TOKEN_ASSIGN:
-                token = parser.stream.expect(lexer.TOKEN_NAME)
-                key = token.value
-                next(parser.stream)
+        if stream.skip_if('name:with'):
+            while stream.look().type == lexer.TOKEN_ASSIGN:
+                key = stream.expect(lexer.TOKEN_NAME).value
+                next(stream)
                 with_vars[key] = parser.parse_expression(False)
 
-        if parser.stream.skip_if('name:count'):
-            name = parser.stream.expect(lexer.TOKEN_NAME).value
-            parser.stream.expect(lexer.TOKEN_ASSIGN)
+        if stream.skip_if('name:count'):
+            name = stream.expect(lexer.TOKEN_NAME).value
+            stream.expect(lexer.TOKEN_ASSIGN)
             value = parser.parse_expression(False)
             count = (name, value)
 
-        if parser.stream.skip_if('name:context'):
-            context = parser.stream.expect(lexer.TOKEN_STRING).value
+        if stream.skip_if('name:context'):
+            context = _intern(stream.expect(lexer.TOKEN_STRING).value)
 
-        parser.stream.expect(lexer.TOKEN_BLOCK_END)
+        stream.expect(lexer.TOKEN_BLOCK_END)
 
+        count_name = count[0] if count is not None else None
         body_singular = None
         body = []
+        append = body.append
         additional_vars = set()
-        for token in parser.stream:
-            if token is lexer.TOKEN_EOF:
-                parser.fail('unexpected end of template, expected endblocktrans tag')
-            if token.type is lexer.TOKEN_DATA:
-                body.append(token.value)
-            elif token.type is lexer.TOKEN_VARIABLE_BEGIN:
-                name = parser.stream.expect(lexer.TOKEN_NAME).value
-                if name not in with_vars and (count is None or count[0] != name):
+        for token in stream:
+            token_type = token.type
+            if token_type == lexer.TOKEN_DATA:
+                append(token.value)
+            elif token_type == lexer.TOKEN_VARIABLE_BEGIN:
+                name = stream.expect(lexer.TOKEN_NAME).value
+                if name not in with_vars and name != count_name:
                     additional_vars.add(name)
-                parser.stream.expect(lexer.TOKEN_VARIABLE_END)
+                stream.expect(lexer.TOKEN_VARIABLE_END)
                 # django converts variables inside the blocktrans tag into
                 # "%(var_name)s" format, so we do the same.
-                body.append('%({})s'.format(name))
-            elif token.type is lexer.TOKEN_BLOCK_BEGIN:
-                if body_singular is None and parser.stream.skip_if('name:plural'):
+                append('%(' + name + ')s')
+            elif token_type == lexer.TOKEN_BLOCK_BEGIN:
+                if body_singular is None and stream.skip_if('name:plural'):
                     if count is None:
                         parser.fail('used plural without specifying count')
-                    parser.stream.expect(lexer.TOKEN_BLOCK_END)
+                    stream.expect(lexer.TOKEN_BLOCK_END)
                     body_singular = body
                     body = []
+                    append = body.append
                 else:
-                    parser.stream.expect('name:endblocktrans')
+                    stream.expect('name:endblocktrans')
                     break
+        else:
+            parser.fail('unexpected end of template, expected endblocktrans tag')
 
         if count is not None and body_singular is None:
             parser.fail('plural form not found')
 
+        body = self._join_body(body, trimmed)
+        if body_singular is not None:
+            body_singular = self._join_body(body_singular, trimmed)
+
+        if not with_vars and count is None and not additional_vars:
+            call = self._make_plain_blocktrans(body, context, lineno)
+        else:
+            call = self._make_blocktrans_call(
+                body_singular, body, with_vars, count, additional_vars, context, lineno
+            )
+
+        if as_var is None:
+            return nodes.Output([call], lineno=lineno)
+        else:
+            return nodes.Assign(as_var, call)
+
+    def _make_plain_blocktrans(self, body, context, lineno):
+        kwargs = []
+        if context is not None:
+            kwargs.append(
+                nodes.Keyword('context', nodes.Const(context, lineno=lineno), lineno=lineno)
+            )
+        call = _call_helper(
+            '_django_blocktrans_plain', [nodes.Const(body, lineno=lineno)], kwargs, lineno=lineno
+        )
+        return nodes.MarkSafe(call, lineno=lineno)
+
+    def _make_blocktrans_call(self, body_singular, body, with_vars, count, additional_vars,
+                              context, lineno):
         trans_vars = [
             nodes.Pair(nodes.Const(key), val, lineno=lineno)
             for key, val in with_vars.items()
@@ -223,54 +500,13 @@ class DjangoI18n(Extension):
                 nodes.Keyword('count_var', nodes.Const(count[0], lineno=lineno), lineno=lineno)
             )
 
-        body = ''.join(body)
-        if trimmed:
-            body = ' '.join(map(lambda s: s.strip(), body.strip().splitlines()))
-
-        if body_singular is not None:
-            body_singular = ''.join(body_singular)
-            if trimmed:
-                body_singular = ' '.join(
-                    map(lambda s: s.strip(), body_singular.strip().splitlines())
-                )
-
         if body_singular is None:
             args = []
         else:
             args = [nodes.TemplateData(body_singular, lineno=lineno)]
         args.append(nodes.TemplateData(body, lineno=lineno))
-        call = nodes.MarkSafe(self.call_method('_make_blocktrans', args, kwargs), lineno=lineno)
-
-        if as_var is None:
-            return nodes.Output([call], lineno=lineno)
-        else:
-            return nodes.Assign(as_var, call)
-
-    def _make_blocktrans(self, singular, plural=None, context=None, trans_vars=None,
-                         count_var=None):
-        if trans_vars is None:
-            trans_vars = {}  # pragma: no cover
-        if self.environment.finalize:
-            finalized_trans_vars = {
-                key: self.environment.finalize(val) for key, val in trans_vars.items()
-            }
-        else:
-            finalized_trans_vars = trans_vars
-        if plural is None:
-            if context is None:
-                return ugettext(force_text(singular)) % finalized_trans_vars
-            else:
-                return pgettext(force_text(context), force_text(singular)) % finalized_trans_vars
-        else:
-            if context is None:
-                return ungettext(
-                    force_text(singular), force_text(plural), trans_vars[count_var]
-                ) % finalized_trans_vars
-            else:
-                return npgettext(
-                    force_text(context), force_text(singular), force_text(plural),
-                    trans_vars[count_var]
-                ) % finalized_trans_vars
+        call = _call_helper('_django_blocktrans', args, kwargs, lineno=lineno)
+        return nodes.MarkSafe(call, lineno=lineno)
 
     def parse(self, parser):
         token = next(parser.stream)
@@ -280,6 +516,54 @@ class DjangoI18n(Extension):
             return self._parse_trans(parser, token.lineno)
 
 
+class _Localizer(object):
+    # Localizes values like DjangoL10n's finalize does, but with the settings,
+    # timezone and language of the render state and the formats looked up
+    # only once per render.
+
+    def __init__(self, state):
+        self.use_l10n = state.use_l10n
+        self.timezone = state.timezone if state.use_tz else None
+        self.language = state.language
+        self.formats = {}
+        if self.use_l10n:
+            lang = self.language
+            self.decimal_sep = get_format('DECIMAL_SEPARATOR', lang, use_l10n=True)
+            self.grouping = get_format('NUMBER_GROUPING', lang, use_l10n=True)
+            self.thousand_sep = get_format('THOUSAND_SEPARATOR', lang, use_l10n=True)
+            self.force_grouping = settings.USE_THOUSAND_SEPARATOR
+
+    def get_format(self, format_type):
+        try:
+            return self.formats[format_type]
+        except KeyError:
+            fmt = self.formats[format_type] = get_format(
+                format_type, self.language, use_l10n=True
+            )
+            return fmt
+
+    def __call__(self, value):
+        if self.timezone is not None and isinstance(value, datetime):
+            if not is_naive(value) and getattr(value, 'convert_to_local_time', True):
+                value = localtime(value, self.timezone)
+        if not self.use_l10n or isinstance(value, _string_types):
+            return value
+        elif isinstance(value, bool):
+            return force_text(value)
+        elif isinstance(value, _number_types):
+            return numberformat.format(
+                value, self.decimal_sep, None, self.grouping, self.thousand_sep,
+                force_grouping=self.force_grouping
+            )
+        elif isinstance(value, datetime):
+            return dateformat.format(value, self.get_format('DATETIME_FORMAT'))
+        elif isinstance(value, date):
+            return dateformat.format(value, self.get_format('DATE_FORMAT'))
+        elif isinstance(value, time):
+            return dateformat.time_format(value, self.get_format('TIME_FORMAT'))
+        return value
+
+
 class DjangoL10n(Extension):
     """
     Implements localization of template variables with respect to
@@ -303,10 +587,19 @@ class DjangoL10n(Extension):
         >>> template.render(context)
         '1,23 1. Oktober 2000 16:10'
 
+    To localize whole columns of a table at once, use the `localize_many`
+    filter or function. It accepts any iterable, e.g. lists, tuples or
+    `array.array`, and returns a list::
+
+        {% for cell in column|localize_many %}<td>{{ cell }}</td>{% endfor %}
+
     """
 
     def __init__(self, environment):
         super(DjangoL10n, self).__init__(environment)
+        environment.filters['localize_many'] = self._localize_many
+        environment.globals['localize_many'] = self._localize_many
+        _use_render_state(environment)
         finalize = []
         if settings.USE_TZ:
             finalize.append(template_localtime)
@@ -328,6 +621,14 @@ class DjangoL10n(Extension):
     def _compose(f, g):
         return lambda var: f(g(var))
 
+    @staticmethod
+    @pass_context
+    def _localize_many(context, values):
+        state = RenderState.of(context)
+        if state.localizer is None:
+            state.localizer = _Localizer(state)
+        return list(map(state.localizer, values))
+
 
 class DjangoStatic(Extension):
     """
@@ -338,17 +639,22 @@ class DjangoStatic(Extension):
         {% static 'my/static.file' as my_file %}
         My static file in a var: {{ my_file }}
 
+    The urls are built with django's `static()` unless the environment's
+    `static_backend` attribute is set to a static backend, see
+    `jdj_tags.staticfiles`.
     """
     tags = set(['static'])
 
-    def _static(self, path):
-        return django_static(path)
+    def __init__(self, environment):
+        super(DjangoStatic, self).__init__(environment)
+        environment.extend(precomputed_urls=None, static_backend=None)
+        environment.globals['_django_static'] = _static
 
     def parse(self, parser):
         lineno = next(parser.stream).lineno
         token = parser.stream.expect(lexer.TOKEN_STRING)
-        path = nodes.Const(token.value)
-        call = self.call_method('_static', [path], lineno=lineno)
+        path = nodes.Const(_intern(token.value))
+        call = _call_helper('_django_static', [path], lineno=lineno)
 
         token = parser.stream.current
         if token.test('name:as'):
@@ -366,16 +672,16 @@ class DjangoNow(Extension):
     """
     tags = set(['now'])
 
-    def _now(self, format_string):
-        tzinfo = get_current_timezone() if settings.USE_TZ else None
-        cur_datetime = datetime.now(tz=tzinfo)
-        return date_format(cur_datetime, format_string)
+    def __init__(self, environment):
+        super(DjangoNow, self).__init__(environment)
+        environment.globals['_django_now'] = _now
+        _use_render_state(environment)
 
     def parse(self, parser):
         lineno = next(parser.stream).lineno
         token = parser.stream.expect(lexer.TOKEN_STRING)
-        format_string = nodes.Const(token.value)
-        call = self.call_method('_now', [format_string], lineno=lineno)
+        format_string = nodes.Const(_intern(token.value))
+        call = _call_helper('_django_now', [format_string], lineno=lineno)
 
         token = parser.stream.current
         if token.test('name:as'):
@@ -399,11 +705,81 @@ class DjangoUrl(Extension):
         Save to variable:
         {% url 'my_view' 'foo' 'bar' as my_url %}
         {{ my_url }}
+
+    If the environment's `strict_urls` attribute is set, the view name and
+    the number of arguments or the keyword argument names are checked
+    against the URLconf when the template is compiled.
+
+    Reversed urls are remembered for the rest of the render, including
+    included templates and macros, unless the environment's
+    `render_url_cache` attribute is unset.
+
+    The urls are reversed with django's `reverse()` unless the environment's
+    `url_reverse_backend` attribute is set to a reverse backend, see
+    `jdj_tags.urlresolvers`.
     """
     tags = set(['url'])
 
-    def _url_reverse(self, name, *args, **kwargs):
-        return reverse(name, args=args, kwargs=kwargs)
+    def __init__(self, environment):
+        super(DjangoUrl, self).__init__(environment)
+        environment.extend(
+            precomputed_urls=None, strict_urls=False, render_url_cache=True,
+            url_reverse_backend=None,
+        )
+        environment.globals['_django_url'] = _url
+        _use_render_state(environment)
+
+    @staticmethod
+    def _url_patterns(view_name):
+        # Looks up the view name the same way django's reverse() does, but
+        # without a current app.
+        resolver = get_resolver(get_urlconf())
+        path = view_name.split(':')
+        view_name = path.pop()
+        resolved_path = []
+        for ns in path:
+            app_list = resolver.app_dict.get(ns)
+            if app_list and ns not in app_list:
+                ns = app_list[0]
+            try:
+                resolver = resolver.namespace_dict[ns][1]
+            except KeyError:
+                if resolved_path:
+                    raise LookupError(
+                        "'{}' is not a registered namespace inside '{}'"
+                        "".format(ns, ':'.join(resolved_path))
+                    )
+                raise LookupError("'{}' is not a registered namespace".format(ns))
+            resolved_path.append(ns)
+        patterns = resolver.reverse_dict.getlist(view_name)
+        if not patterns:
+            raise LookupError("no url pattern named '{}'".format(view_name))
+        return patterns
+
+    def _check_url(self, parser, view_name, args, kwargs, lineno):
+        try:
+            patterns = self._url_patterns(view_name)
+        except LookupError as e:
+            parser.fail(e.args[0], lineno=lineno)
+        for pattern in patterns:
+            possibilities, defaults = pattern[0], pattern[2]
+            for _, params in possibilities:
+                if args:
+                    if len(args) == len(params):
+                        return
+                elif not set(kwargs).symmetric_difference(params).difference(defaults):
+                    return
+        if args:
+            parser.fail(
+                "url '{}' doesn't take {} arguments".format(view_name, len(args)),
+                lineno=lineno
+            )
+        else:
+            parser.fail(
+                "url '{}' doesn't take the keyword arguments {}"
+                "".format(view_name, ', '.join(sorted(kwargs)) or '(none)'),
+                lineno=lineno
+            )
 
     @staticmethod
     def parse_expression(parser):
@@ -414,7 +790,7 @@ class DjangoUrl(Extension):
         # That's why we have to check if it's a string literal first.
         token = parser.stream.current
         if token.test(lexer.TOKEN_STRING):
-            expr = nodes.Const(force_text(token.value), lineno=token.lineno)
+            expr = nodes.Const(_intern(force_text(token.value)), lineno=token.lineno)
             next(parser.stream)
         else:
             expr = parser.parse_expression(False)
@@ -422,50 +798,55 @@ class DjangoUrl(Extension):
         return expr
 
     def parse(self, parser):
-        lineno = next(parser.stream).lineno
-        view_name = parser.stream.expect(lexer.TOKEN_STRING)
-        view_name = nodes.Const(view_name.value, lineno=view_name.lineno)
+        stream = parser.stream
+        lineno = next(stream).lineno
+        view_name = stream.expect(lexer.TOKEN_STRING)
+        view_name = nodes.Const(_intern(view_name.value), lineno=view_name.lineno)
 
-        args = None
+        args = []
         kwargs = None
         as_var = None
 
-        while parser.stream.current.type != lexer.TOKEN_BLOCK_END:
-            token = parser.stream.current
-            if token.test('name:as'):
-                next(parser.stream)
-                token = parser.stream.expect(lexer.TOKEN_NAME)
+        # the first argument decides whether all of them are positional or
+        # keyword arguments
+        if stream.look().type == lexer.TOKEN_ASSIGN:
+            kwargs = {}
+
+        while True:
+            token = stream.current
+            token_type = token.type
+            if token_type == lexer.TOKEN_BLOCK_END:
+                break
+            if token_type == lexer.TOKEN_NAME and token.value == 'as':
+                next(stream)
+                token = stream.expect(lexer.TOKEN_NAME)
                 as_var = nodes.Name(token.value, 'store', lineno=token.lineno)
                 break
-            if args is not None:
+            if kwargs is None:
                 args.append(self.parse_expression(parser))
-            elif kwargs is not None:
-                if token.type != lexer.TOKEN_NAME:
+            else:
+                if token_type != lexer.TOKEN_NAME:
                     parser.fail(
                         "got '{}', expected name for keyword argument"
                         "".format(lexer.describe_token(token)),
                         lineno=token.lineno
                     )
-                arg = token.value
-                next(parser.stream)
-                parser.stream.expect(lexer.TOKEN_ASSIGN)
-                token = parser.stream.current
-                kwargs[arg] = self.parse_expression(parser)
-            else:
-                if parser.stream.look().type == lexer.TOKEN_ASSIGN:
-                    kwargs = {}
-                else:
-                    args = []
-                continue
-
-        if args is None:
-            args = []
-        args.insert(0, view_name)
-
-        if kwargs is not None:
-            kwargs = [nodes.Keyword(key, val) for key, val in kwargs.items()]
-
-        call = self.call_method('_url_reverse', args, kwargs, lineno=lineno)
+                next(stream)
+                stream.expect(lexer.TOKEN_ASSIGN)
+                kwargs[token.value] = self.parse_expression(parser)
+
+        if kwargs is None:
+            kwargs = {}
+        if parser.environment.strict_urls:
+            self._check_url(parser, view_name.value, args, kwargs, lineno)
+
+        # args and kwargs are passed as a tuple and a dict, so url arguments
+        # can't clash with the parameter names of the helper
+        args = nodes.Tuple(args, 'load', lineno=lineno)
+        kwargs = nodes.Dict([
+            nodes.Pair(nodes.Const(key), val, lineno=lineno) for key, val in kwargs.items()
+        ], lineno=lineno)
+        call = _call_helper('_django_url', [view_name, args, kwargs], lineno=lineno)
         if as_var is None:
             return nodes.Output([call], lineno=lineno)
         else:
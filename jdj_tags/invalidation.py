@@ -0,0 +1,103 @@
+"""
+Central invalidation of the caches of the extensions.
+
+A cache registers for the topics its values depend on and is cleared as
+soon as one of them changes::
+
+    from jdj_tags import invalidation
+
+    cache = invalidation.Cache(invalidation.URLS)
+
+Changes are picked up from django's ``setting_changed`` signal (sent by
+``override_settings`` in tests) and from the autoreloader's ``file_changed``
+signal for translation catalogs. Code that changes any of them in another
+way, e.g. by calling ``clear_url_caches()``, calls :func:`invalidate` with
+the affected topics.
+"""
+from __future__ import unicode_literals
+
+import weakref
+from collections import defaultdict
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+try:
+    from django.utils.autoreload import file_changed
+except ImportError:  # Django < 2.2
+    file_changed = None
+
+URLS = 'urls'
+STATIC = 'static'
+TRANSLATIONS = 'translations'
+
+TOPICS = (URLS, STATIC, TRANSLATIONS)
+
+SETTING_TOPICS = {
+    'DEBUG': (STATIC,),
+    'INSTALLED_APPS': (URLS, STATIC, TRANSLATIONS),
+    'ROOT_URLCONF': (URLS,),
+    'FORCE_SCRIPT_NAME': (URLS, STATIC),
+    'STATIC_URL': (STATIC,),
+    'STATIC_ROOT': (STATIC,),
+    'STATICFILES_DIRS': (STATIC,),
+    'STATICFILES_STORAGE': (STATIC,),
+    'STORAGES': (STATIC,),
+    'USE_I18N': (TRANSLATIONS,),
+    'LANGUAGE_CODE': (TRANSLATIONS,),
+    'LANGUAGES': (TRANSLATIONS,),
+    'LOCALE_PATHS': (TRANSLATIONS,),
+}
+
+# caches are keyed by id() as they don't have to be hashable
+_caches = defaultdict(weakref.WeakValueDictionary)
+
+
+def register(cache, *topics):
+    """
+    Registers `cache` to be cleared by calling its ``clear()`` method when
+    one of `topics` is invalidated. Only a weak reference to `cache` is kept.
+    Returns `cache`.
+    """
+    for topic in topics:
+        if topic not in TOPICS:
+            raise ValueError("unknown topic '{}'".format(topic))
+        _caches[topic][id(cache)] = cache
+    return cache
+
+
+def invalidate(*topics):
+    """
+    Clears all caches registered for any of `topics`, all of them if no
+    topic is given.
+    """
+    caches = {}
+    for topic in topics or TOPICS:
+        caches.update(_caches[topic].items())
+    for cache in caches.values():
+        cache.clear()
+
+
+class Cache(dict):
+    """
+    A dict that registers itself for `topics`.
+    """
+    def __init__(self, *topics):
+        super(Cache, self).__init__()
+        register(self, *topics)
+
+
+@receiver(setting_changed)
+def _setting_changed(setting, **kwargs):
+    topics = SETTING_TOPICS.get(setting)
+    if topics:
+        invalidate(*topics)
+
+
+def _file_changed(file_path, **kwargs):
+    if str(file_path).endswith('.mo'):
+        invalidate(TRANSLATIONS)
+
+
+if file_changed is not None:
+    file_changed.connect(_file_changed)
@@ -0,0 +1,244 @@
+"""
+Extraction of the msgids of templates and preloading of their translations.
+
+:func:`extract` parses templates with the environment's extensions, so the
+msgids of `{% blocktrans %}` are exactly the ones it looks up, including
+``trimmed`` and the ``%(var)s`` placeholders. The result can be stored as
+an index, checked against the catalogs and used to preload the
+translations at startup::
+
+    from jdj_tags import msgids
+
+    index = msgids.extract(env)
+    with open('msgids.json', 'w') as fp:
+        msgids.write_index(index, fp)
+
+    # at startup
+    with open('msgids.json') as fp:
+        preloaded = msgids.PreloadedTranslations(msgids.read_index(fp))
+    preloaded.install(env)
+    preloaded.preload('de', 'fr')
+
+Django still loads its catalogs completely; the preloaded tables are an
+additional, small dict per language that answers the lookups of the
+templates without going through django's gettext machinery.
+"""
+from __future__ import unicode_literals
+
+import json
+import threading
+
+from django.utils import translation
+from django.utils.safestring import SafeData
+from django.utils.translation import npgettext, pgettext, ugettext, ungettext
+from jinja2 import nodes
+
+from jdj_tags import invalidation
+
+try:
+    _text_type = unicode  # noqa
+except NameError:  # Python 3
+    _text_type = str
+
+# global -> (whether it has a context, whether it has a plural)
+GETTEXT_FUNCTIONS = {
+    '_': (False, False),
+    'gettext': (False, False),
+    'pgettext': (True, False),
+    'ngettext': (False, True),
+    'npgettext': (True, True),
+}
+
+
+def _value(node):
+    if isinstance(node, nodes.Const) and isinstance(node.value, _text_type):
+        return node.value
+    if isinstance(node, nodes.TemplateData):
+        return node.data
+    return None
+
+
+def _call_msgid(call):
+    # Returns (context, msgid, plural) of a gettext or i18n tag call or
+    # None if it isn't one or its strings aren't constant.
+    if not isinstance(call.node, nodes.Name):
+        return None
+    name = call.node.name
+    values = [_value(arg) for arg in call.args]
+    if name in ('_django_trans', '_django_blocktrans', '_django_blocktrans_plain'):
+        context = None
+        for kwarg in call.kwargs:
+            if kwarg.key == 'context':
+                context = _value(kwarg.value)
+            elif kwarg.key == 'noop':
+                return None
+        if len(values) == 1:
+            return context, values[0], None
+        return context, values[0], values[1]
+    if name not in GETTEXT_FUNCTIONS:
+        return None
+    has_context, has_plural = GETTEXT_FUNCTIONS[name]
+    values = values[:1 + has_context + has_plural]
+    if len(values) != 1 + has_context + has_plural or None in values:
+        return None
+    context = values.pop(0) if has_context else None
+    return context, values[0], values[1] if has_plural else None
+
+
+def extract(environment, template_names=None):
+    """
+    Parses the templates and returns their msgids as a list of dicts with
+    the keys ``msgid``, ``context``, ``plural`` and ``locations``, a list of
+    ``[template_name, lineno]``. Defaults to all templates the loader knows
+    about. Calls whose strings aren't constant are skipped.
+    """
+    if template_names is None:
+        template_names = environment.list_templates()
+    entries = {}
+    for name in template_names:
+        source, filename, _ = environment.loader.get_source(environment, name)
+        ast = environment.parse(source, name, filename)
+        for call in ast.find_all(nodes.Call):
+            key = _call_msgid(call)
+            if key is None:
+                continue
+            entry = entries.get(key)
+            if entry is None:
+                context, msgid, plural = key
+                entry = entries[key] = {
+                    'msgid': msgid, 'context': context, 'plural': plural, 'locations': [],
+                }
+            entry['locations'].append([name, call.lineno])
+    return sorted(
+        entries.values(),
+        key=lambda entry: (entry['msgid'], entry['context'] or '', entry['plural'] or '')
+    )
+
+
+def write_index(entries, fp):
+    """
+    Writes the entries returned by :func:`extract` as JSON to `fp`.
+    """
+    json.dump(entries, fp, indent=2, sort_keys=True)
+
+
+def read_index(fp):
+    """
+    Reads an index written by :func:`write_index`.
+    """
+    return json.load(fp)
+
+
+def missing(entries, language):
+    """
+    Returns the entries that aren't translated to `language`, i.e. whose
+    translation is the msgid itself.
+    """
+    result = []
+    with translation.override(language):
+        for entry in entries:
+            msgid, context, plural = entry['msgid'], entry['context'], entry['plural']
+            if plural is None:
+                if context is None:
+                    translated = ugettext(msgid)
+                else:
+                    translated = pgettext(context, msgid)
+                if translated == msgid:
+                    result.append(entry)
+            else:
+                forms = set(
+                    ungettext(msgid, plural, n) if context is None else
+                    npgettext(context, msgid, plural, n)
+                    for n in (1, 2)
+                )
+                if forms == set([msgid, plural]):
+                    result.append(entry)
+    return result
+
+
+class PreloadedTranslations(object):
+    """
+    Answers the `gettext` and `pgettext` lookups of the msgids in
+    `entries` from a dict per language, which is filled on the first lookup
+    in a language or by :meth:`preload`. Everything else, including plural
+    lookups, goes to django.
+
+    The results are the same as django's: the strings of `{% blocktrans %}`
+    are `Markup` when autoescaping is enabled, for those django returns the
+    msgid unchanged if it isn't translated, so they are only answered from
+    the table if they have a translation that differs from the msgid.
+
+    The tables are dropped when the translations are invalidated.
+    """
+    def __init__(self, entries):
+        self.msgids = [
+            (entry['context'], entry['msgid']) for entry in entries
+            # django normalizes line endings before the lookup
+            if entry['plural'] is None and entry['msgid'] and '\r' not in entry['msgid']
+        ]
+        self.gettext = ugettext
+        self.pgettext = pgettext
+        self._lock = threading.Lock()
+        self.tables = {}
+        invalidation.register(self, invalidation.TRANSLATIONS)
+
+    def install(self, environment):
+        """
+        Wraps the `_`, `gettext` and `pgettext` globals of `environment`,
+        which `{% trans %}` and `{% blocktrans %}` use as well, and sets its
+        ``preloaded_translations`` attribute. Returns `self`.
+        """
+        self.gettext = gettext = environment.globals['gettext']
+        self.pgettext = pgettext = environment.globals['pgettext']
+
+        def gettext_wrapper(message):
+            return self.lookup(None, message, gettext, (message,))
+
+        def pgettext_wrapper(context, message):
+            return self.lookup(context, message, pgettext, (context, message))
+
+        environment.globals['_'] = environment.globals['gettext'] = gettext_wrapper
+        environment.globals['pgettext'] = pgettext_wrapper
+        environment.preloaded_translations = self
+        return self
+
+    def lookup(self, context, message, func, args):
+        """
+        Returns the translation of `message`, calls ``func(*args)`` if it
+        isn't preloaded.
+        """
+        table = self.tables.get(translation.get_language())
+        if table is None:
+            table = self._load()
+        try:
+            translated, identical = table[context, message]
+        except (KeyError, TypeError):
+            return func(*args)
+        if type(message) is not _text_type and (identical or isinstance(message, SafeData)):
+            return func(*args)
+        return translated
+
+    def _load(self):
+        language = translation.get_language()
+        table = {}
+        for context, msgid in self.msgids:
+            if context is None:
+                translated = self.gettext(msgid)
+            else:
+                translated = self.pgettext(context, msgid)
+            table[context, msgid] = (translated, translated == msgid)
+        with self._lock:
+            self.tables[language] = table
+        return table
+
+    def preload(self, *languages):
+        """
+        Fills the tables of `languages`.
+        """
+        for language in languages:
+            with translation.override(language):
+                self._load()
+
+    def clear(self):
+        with self._lock:
+            self.tables = {}
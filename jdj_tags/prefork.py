@@ -0,0 +1,229 @@
+"""
+Warm-up of the `{% static %}` and `{% url %}` tables for pre-fork servers.
+
+Call :func:`warm_up` in the master process before it forks its workers, e.g.
+in gunicorn's ``on_starting`` hook together with ``preload_app = True``::
+
+    from django.template import engines
+    from jdj_tags.prefork import warm_up
+
+    def on_starting(server):
+        warm_up(engines['jinja2'].env, freeze=True)
+
+All templates are compiled into the environment's cache, which has to be
+large enough to hold them (e.g. ``cache_size=-1`` in the backend's
+``OPTIONS``), and every tag whose arguments are constants is resolved once.
+The workers inherit the results and share their memory pages copy-on-write
+instead of each building their own copy after the fork.
+"""
+from __future__ import unicode_literals
+
+import gc
+import warnings
+
+from django.utils.translation import get_language
+from jinja2 import nodes
+
+from jdj_tags import extensions, invalidation
+from jdj_tags.extensions import _intern, _url_key
+
+try:
+    from django.urls import NoReverseMatch, get_script_prefix, get_urlconf
+except ImportError:  # Django < 1.10
+    from django.core.urlresolvers import NoReverseMatch, get_script_prefix, get_urlconf
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+
+class PrecomputedUrls(object):
+    """
+    Tables of static and reversed urls computed by :func:`warm_up`. They
+    aren't changed after the warm-up, so the workers keep sharing them.
+
+    Lookups return ``None`` for everything that was not precomputed and
+    whenever the active script prefix or urlconf differs from the one at
+    warm-up time, so the tags fall back to django. Reversed urls are also
+    only returned in the language of the warm-up, ``i18n_patterns()`` puts
+    it into the url. The tables are emptied when the urls or static files
+    are invalidated.
+    """
+    __slots__ = ('script_prefix', 'language', 'static_urls', 'urls', '__weakref__')
+
+    def __init__(self, script_prefix, language, static_urls, urls):
+        self.script_prefix = script_prefix
+        self.language = language
+        self.static_urls = static_urls
+        self.urls = urls
+        invalidation.register(self, invalidation.URLS, invalidation.STATIC)
+
+    def clear(self):
+        # the tables are shared with other processes, replacing them doesn't
+        # touch their memory pages
+        self.static_urls = {}
+        self.urls = {}
+
+    def static(self, path):
+        if not self.static_urls or get_script_prefix() != self.script_prefix:
+            return None
+        return self.static_urls.get(path)
+
+    def reverse(self, name, args, kwargs):
+        if not self.urls or get_urlconf() is not None:
+            return None
+        if get_script_prefix() != self.script_prefix or get_language() != self.language:
+            return None
+        try:
+            return self.urls.get(_url_key(name, args, kwargs))
+        except TypeError:
+            # unhashable argument, can't have been precomputed
+            return None
+
+
+def _constant_calls(ast, helper):
+    for call in ast.find_all(nodes.Call):
+        if not isinstance(call.node, nodes.Name) or call.node.name != helper:
+            continue
+        try:
+            yield tuple(arg.as_const() for arg in call.args)
+        except nodes.Impossible:
+            continue
+
+
+def collect_constants(environment, template_names=None):
+    """
+    Parses the templates and returns a set of the static paths and a list of
+    the ``(view_name, args, kwargs)`` tuples of all `{% static %}` and
+    `{% url %}` tags that only have constant arguments, without duplicates.
+    """
+    if template_names is None:
+        template_names = environment.list_templates()
+    static_paths = set()
+    # 1, 1.0 and True are equal but give different urls
+    urls = {}
+    for name in template_names:
+        source, filename, _ = environment.loader.get_source(environment, name)
+        ast = environment.parse(source, name, filename)
+        for path, in _constant_calls(ast, '_django_static'):
+            static_paths.add(path)
+        for view_name, args, kwargs in _constant_calls(ast, '_django_url'):
+            try:
+                key = _url_key(view_name, args, kwargs)
+                if key not in urls:
+                    urls[key] = (view_name, args, kwargs)
+            except TypeError:
+                # unhashable argument, the tag reverses it on every render
+                continue
+    return static_paths, list(urls.values())
+
+
+def _cache_size(environment):
+    # the cache_size the environment was created with, -1 if unbounded
+    cache = environment.cache
+    if cache is None:
+        return 0
+    if isinstance(cache, dict):
+        return -1
+    return cache.capacity
+
+
+def warm_up(environment, template_names=None, freeze=False):
+    """
+    Compiles the templates into the environment's cache and precomputes all
+    constant static and reversed urls, using the environment's
+    `static_backend` and `url_reverse_backend` if it has them. Defaults to
+    all templates the loader knows about. Warns if the cache can't hold all
+    templates, the workers would compile the evicted ones again.
+
+    If `freeze` is set, the garbage collector is told to ignore all objects
+    that exist at that point (``gc.freeze()``, Python 3.7+) so collections in
+    the workers don't touch and thereby copy the shared pages.
+
+    Returns the :class:`PrecomputedUrls` that were installed on the
+    environment.
+    """
+    if template_names is None:
+        template_names = environment.list_templates()
+    cache_size = _cache_size(environment)
+    if 0 <= cache_size < len(template_names):
+        warnings.warn(
+            'the template cache holds {} of the {} templates, create the environment '
+            'with cache_size=-1 to keep all of them'.format(cache_size, len(template_names)),
+            RuntimeWarning, stacklevel=2
+        )
+    for name in template_names:
+        environment.get_template(name)
+
+    static_paths, urls = collect_constants(environment, template_names)
+
+    static = getattr(environment, 'static_backend', None)
+    static = extensions.django_static if static is None else static.url
+    static_urls = {}
+    for path in static_paths:
+        static_urls[_intern(path)] = _intern(static(path))
+
+    backend = getattr(environment, 'url_reverse_backend', None)
+    reversed_urls = {}
+    for name, args, kwargs in urls:
+        try:
+            if backend is None:
+                url = extensions.reverse(name, args=args, kwargs=kwargs)
+            else:
+                url = backend.reverse(name, args, kwargs)
+        except NoReverseMatch:
+            # fails again when rendering, django reports it then
+            continue
+        reversed_urls[_url_key(_intern(name), args, kwargs)] = _intern(url)
+
+    table = PrecomputedUrls(get_script_prefix(), get_language(), static_urls, reversed_urls)
+    environment.precomputed_urls = table
+
+    if freeze and hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+    return table
+
+
+def memory_report(environment, template_names=None, workers=2):
+    """
+    Runs :func:`warm_up` on an overlay of `environment` with an empty
+    template cache of the same size and measures the memory it allocates,
+    which is the amount every worker would allocate on its own without the
+    warm-up. The environment itself, its cache and its precomputed urls are
+    left alone.
+    Requires :mod:`tracemalloc` (Python 3.4+).
+
+    Returns a dict with the number of templates and precomputed urls, the
+    bytes allocated per worker and ``max_bytes_saved``, the bytes `workers`
+    processes save by sharing them. That is an upper bound: reference
+    counting writes to the shared objects, so some of their pages are
+    copied in the workers anyway.
+    """
+    if tracemalloc is None:
+        raise RuntimeError('memory_report() requires tracemalloc (Python 3.4+)')
+    if template_names is None:
+        template_names = environment.list_templates()
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        overlay = environment.overlay(cache_size=_cache_size(environment))
+        table = warm_up(overlay, template_names)
+        per_worker = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    return {
+        'templates': len(template_names),
+        'static_urls': len(table.static_urls),
+        'urls': len(table.urls),
+        'workers': workers,
+        'bytes_per_worker': per_worker,
+        'max_bytes_saved': per_worker * (workers - 1),
+    }
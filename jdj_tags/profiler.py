@@ -0,0 +1,255 @@
+"""
+Profiles the rendering of a directory of templates::
+
+    python -m jdj_tags.profiler templates/ --context context.json --number 100
+
+Every template is rendered `--number` times with
+`jdj_tags.extensions.DjangoCompat` and the time is reported per template,
+per tag or gettext function and per template line. The context is read
+from a JSON file or, if its name ends with ``.pickle`` or ``.pkl``, from
+a pickle.
+
+Django is set up from ``DJANGO_SETTINGS_MODULE`` or, without it, with the
+default settings, so `{% url %}` needs the settings of a project.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import functools
+import json
+import os
+import pickle
+import sys
+from collections import defaultdict
+from timeit import default_timer
+
+from jinja2 import Environment, FileSystemLoader
+
+from jdj_tags.extensions import DjangoCompat
+
+# the helper globals of the tags and the gettext functions with their labels
+TAGS = {
+    '_django_csrf_token': '{% csrf_token %}',
+    '_django_trans': '{% trans %}',
+    '_django_blocktrans': '{% blocktrans %}',
+    '_django_blocktrans_plain': '{% blocktrans %}',
+    '_django_static': '{% static %}',
+    '_django_now': '{% now %}',
+    '_django_url': '{% url %}',
+    '_': '_()',
+    'gettext': 'gettext()',
+    'pgettext': 'pgettext()',
+    'ngettext': 'ngettext()',
+    'npgettext': 'npgettext()',
+}
+
+
+class Profiler(object):
+    """
+    Renders templates of `environment` and collects the timings.
+
+    The time of a tag includes everything it calls, a tag that is called
+    from another one (e.g. the gettext of a `{% blocktrans %}`) only counts
+    for the outer one. Lines are profiled in a separate pass as tracing
+    them slows rendering down a lot; their time includes everything that
+    is called from the line, including other templates.
+    """
+    def __init__(self, environment):
+        self.environment = environment
+        # name -> [renders, seconds]
+        self.templates = defaultdict(lambda: [0, 0.0])
+        # label of the tag or gettext function -> [calls, seconds]
+        self.tags = defaultdict(lambda: [0, 0.0])
+        # (template name, line) -> [hits, seconds]
+        self.lines = defaultdict(lambda: [0, 0.0])
+        self.errors = {}
+        self._in_tag = False
+        for name, tag in TAGS.items():
+            func = environment.globals.get(name)
+            if func is not None:
+                environment.globals[name] = self._wrap_tag(tag, func)
+
+    def _wrap_tag(self, tag, func):
+        # functools.wraps() also copies the attributes jinja uses to mark
+        # functions that get the context passed.
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if self._in_tag:
+                return func(*args, **kwargs)
+            self._in_tag = True
+            start = default_timer()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stats = self.tags[tag]
+                stats[0] += 1
+                stats[1] += default_timer() - start
+                self._in_tag = False
+        return wrapper
+
+    def profile(self, template_names, context=None, number=100, lines=True):
+        """
+        Renders every template `number` times with `context`. Templates
+        that fail to load or render are recorded in :attr:`errors`.
+        """
+        context = context or {}
+        for name in template_names:
+            # the tags only record while the renders are timed
+            self._in_tag = True
+            try:
+                template = self.environment.get_template(name)
+                template.render(context)
+            except Exception as e:
+                self.errors[name] = '{}: {}'.format(type(e).__name__, e)
+                continue
+
+            self._in_tag = False
+            for _ in range(number):
+                start = default_timer()
+                template.render(context)
+                stats = self.templates[name]
+                stats[0] += 1
+                stats[1] += default_timer() - start
+
+            if lines:
+                self._in_tag = True
+                self._profile_lines(template, context, number)
+        self._in_tag = False
+
+    def _profile_lines(self, template, context, number):
+        # templates without a file share the filename "<template>", so
+        # they are looked up by code object
+        templates = {}
+        # (code, python line) -> (template name, template line)
+        lines = {}
+        last = {}
+
+        def trace_lines(frame, event, arg):
+            now = default_timer()
+            line, start = last.get(frame, (None, None))
+            if line is not None:
+                stats = self.lines[line]
+                stats[0] += 1
+                stats[1] += now - start
+            if event == 'return':
+                last.pop(frame, None)
+            else:
+                key = (frame.f_code, frame.f_lineno)
+                line = lines.get(key)
+                if line is None:
+                    info = templates[key[0]]
+                    line = lines[key] = (info.name, info.get_corresponding_lineno(key[1]))
+                last[frame] = (line, default_timer())
+            return trace_lines
+
+        def trace_calls(frame, event, arg):
+            if event != 'call':
+                return None
+            code = frame.f_code
+            if code not in templates:
+                templates[code] = self._template_for(frame.f_globals)
+            if templates[code] is None:
+                return None
+            return trace_lines
+
+        previous = sys.gettrace()
+        sys.settrace(trace_calls)
+        try:
+            for _ in range(number):
+                template.render(context)
+        finally:
+            sys.settrace(previous)
+
+    def _template_for(self, frame_globals):
+        # the module of a compiled template has its name and debug info as
+        # globals
+        name = frame_globals.get('name')
+        if name is None or 'debug_info' not in frame_globals:
+            return None
+        return self.environment.get_template(name)
+
+    @staticmethod
+    def _ranked(stats, limit):
+        return sorted(stats.items(), key=lambda item: -item[1][1])[:limit]
+
+    def report(self, out=None, limit=20):
+        """
+        Prints the timings of the templates, tags and lines, the slowest
+        first, to `out`, which defaults to stdout.
+        """
+        out = out or sys.stdout
+        sections = [
+            ('Templates', 'renders', self.templates, lambda name: name),
+            ('Tags and gettext functions', 'calls', self.tags, lambda tag: tag),
+            ('Lines', 'hits', self.lines, lambda line: '{}:{}'.format(*line)),
+        ]
+        for title, unit, stats, label in sections:
+            if not stats:
+                continue
+            print(title, file=out)
+            print('{:<50} {:>10} {:>12} {:>12}'.format('', unit, 'total ms', 'us each'),
+                  file=out)
+            for key, (count, seconds) in self._ranked(stats, limit):
+                print('{:<50} {:>10} {:>12.2f} {:>12.2f}'.format(
+                    label(key), count, seconds * 1e3, seconds / count * 1e6
+                ), file=out)
+            print(file=out)
+        for name, error in sorted(self.errors.items()):
+            print('{}: failed with {}'.format(name, error), file=out)
+
+
+def load_context(path):
+    """
+    Returns the context in the JSON or pickle file `path`.
+    """
+    if path.endswith(('.pickle', '.pkl')):
+        with open(path, 'rb') as fp:
+            return pickle.load(fp)
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def _setup_django():
+    import django
+    from django.conf import settings
+
+    if not settings.configured and 'DJANGO_SETTINGS_MODULE' not in os.environ:
+        settings.configure()
+    django.setup()
+
+
+def main(argv=None, out=None):
+    """
+    Runs the profiler with the command line arguments `argv` and prints the
+    report to `out`. Returns the :class:`Profiler`.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m jdj_tags.profiler',
+        description='Profiles the rendering of jinja2 templates with the django tags.'
+    )
+    parser.add_argument('directory', help='the directory of the templates')
+    parser.add_argument('--context', help='a JSON or pickle (.pickle, .pkl) file with the context')
+    parser.add_argument('-n', '--number', type=int, default=100,
+                        help='how often each template is rendered (default: 100)')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='the number of entries per section (default: 20)')
+    parser.add_argument('--no-lines', dest='lines', action='store_false',
+                        help="don't profile the template lines")
+    parser.add_argument('--extension', action='append', dest='extensions',
+                        help='only profile templates with this file extension, e.g. html '
+                             '(can be given multiple times)')
+    args = parser.parse_args(argv)
+
+    _setup_django()
+    environment = Environment(loader=FileSystemLoader(args.directory), extensions=[DjangoCompat])
+    context = load_context(args.context) if args.context else {}
+
+    profiler = Profiler(environment)
+    template_names = environment.list_templates(extensions=args.extensions)
+    profiler.profile(template_names, context, args.number, args.lines)
+    profiler.report(out, args.limit)
+    return profiler
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Static backends for the `{% static %}` tag.
+
+`jdj_tags.extensions.DjangoStatic` builds static urls with the backend in
+the environment's `static_backend` attribute and with django's ``static()``
+if it's ``None``::
+
+    from jdj_tags.staticfiles import CachedStatic
+
+    env.static_backend = CachedStatic(hosts=[
+        'https://static1.example.com',
+        'https://static2.example.com',
+    ])
+
+A backend implements ``url(path)``, which returns the url of the static
+file `path`, and ``clear()``, which drops everything it has cached.
+Subclasses of :class:`StaticBackend` are registered for the ``STATIC`` topic
+of `jdj_tags.invalidation` and cleared when the static files settings
+change.
+"""
+from __future__ import unicode_literals
+
+import zlib
+
+from django.apps import apps
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri, iri_to_uri
+
+from jdj_tags import extensions, invalidation
+
+try:
+    from urllib.parse import quote, urljoin
+except ImportError:  # Python 2
+    from urllib import quote
+    from urlparse import urljoin
+
+try:
+    from django.urls import get_script_prefix
+except ImportError:  # Django < 1.10
+    from django.core.urlresolvers import get_script_prefix
+
+
+class StaticBackend(object):
+    """
+    Base class of the static backends.
+    """
+    def __init__(self):
+        invalidation.register(self, invalidation.STATIC)
+
+    def url(self, path):
+        raise NotImplementedError  # pragma: no cover
+
+    def clear(self):
+        pass
+
+
+class CachedStatic(StaticBackend):
+    """
+    Asks django's ``static()``, and thereby the staticfiles storage, once
+    per path and script prefix and remembers the url. Once `maxsize` urls
+    are cached the cache starts over.
+
+    If `hosts` are given, relative urls are prefixed with one of them. The
+    host is chosen by a hash of the path, so a file is always served from
+    the same host and browsers can download from several hosts in parallel.
+    Absolute urls, e.g. from a `STATIC_URL` that already points to a CDN,
+    are left alone.
+    """
+    def __init__(self, hosts=None, maxsize=10000):
+        super(CachedStatic, self).__init__()
+        self.hosts = [host.rstrip('/') for host in hosts or ()]
+        self.maxsize = maxsize
+        self.urls = {}
+
+    def url(self, path):
+        key = (get_script_prefix(), path)
+        try:
+            return self.urls[key]
+        except KeyError:
+            pass
+        url = self.resolve(path)
+        if self.hosts and url.startswith('/') and not url.startswith('//'):
+            url = self.shard(path) + url
+        if len(self.urls) >= self.maxsize:
+            self.urls = {}
+        self.urls[key] = url
+        return url
+
+    def resolve(self, path):
+        """
+        Returns the url of `path` before it is sharded.
+        """
+        return extensions.django_static(path)
+
+    def shard(self, path):
+        """
+        Returns the host for `path`.
+        """
+        # the mask makes the checksum unsigned on Python 2 as well
+        checksum = zlib.crc32(path.encode('utf-8')) & 0xffffffff
+        return self.hosts[checksum % len(self.hosts)]
+
+    def clear(self):
+        self.urls = {}
+
+
+class PrefixStatic(CachedStatic):
+    """
+    Joins the paths with `STATIC_URL` without asking the staticfiles
+    storage. That is only correct for storages that serve every file under
+    its own name from `STATIC_URL`, like ``StaticFilesStorage``, but not for
+    storages that rename files, like ``ManifestStaticFilesStorage``.
+    """
+    def __init__(self, hosts=None, maxsize=10000):
+        super(PrefixStatic, self).__init__(hosts, maxsize)
+        # script prefix -> (STATIC_URL, whether staticfiles is installed)
+        self.prefixes = {}
+
+    def resolve(self, path):
+        # django adds the script prefix to a relative STATIC_URL
+        script_prefix = get_script_prefix()
+        try:
+            prefix, storage = self.prefixes[script_prefix]
+        except KeyError:
+            prefix = iri_to_uri(settings.STATIC_URL)
+            storage = apps.is_installed('django.contrib.staticfiles')
+            self.prefixes[script_prefix] = prefix, storage
+        # the same joins as django's static() and FileSystemStorage.url()
+        if storage:
+            return urljoin(prefix, filepath_to_uri(path).lstrip('/'))
+        return urljoin(prefix, quote(path))
+
+    def clear(self):
+        super(PrefixStatic, self).clear()
+        self.prefixes = {}
@@ -0,0 +1,164 @@
+"""
+Statistics of the translation lookups of templates.
+
+Install :class:`TranslationStats` on an environment with the i18n extension
+to count, per language, how often every msgid is looked up, how often the
+lookup falls back to the source string and how much time is spent in
+django's gettext functions::
+
+    from jdj_tags.stats import TranslationStats
+
+    stats = TranslationStats().install(env)
+    ...
+    with open('translation-stats.json', 'w') as fp:
+        stats.dump(fp)
+
+The statistics are meant for finding the hot and the untranslated strings,
+recording them makes every lookup a little slower.
+"""
+from __future__ import unicode_literals
+
+import json
+import threading
+from timeit import default_timer
+
+from django.utils.translation import get_language
+
+
+class TranslationStats(object):
+    """
+    Records the lookups of the `_`, `gettext`, `pgettext`, `ngettext` and
+    `npgettext` globals of the environments it is installed on. These are
+    used by `{% trans %}` and `{% blocktrans %}` as well.
+
+    A lookup counts as a fallback if django returns the msgid itself (or its
+    plural), which also happens for strings whose translation is identical
+    to the source.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (language, context, msgid, plural) -> [lookups, fallbacks, seconds]
+        self._entries = {}
+
+    def install(self, environment):
+        """
+        Wraps the gettext globals of `environment` and sets its
+        ``translation_stats`` attribute. Returns the stats.
+        """
+        env_globals = environment.globals
+        gettext = env_globals['gettext']
+        pgettext = env_globals['pgettext']
+        ngettext = env_globals['ngettext']
+        npgettext = env_globals['npgettext']
+
+        def gettext_wrapper(message):
+            start = default_timer()
+            result = gettext(message)
+            self.record(None, message, None, result, default_timer() - start)
+            return result
+
+        def pgettext_wrapper(context, message):
+            start = default_timer()
+            result = pgettext(context, message)
+            self.record(context, message, None, result, default_timer() - start)
+            return result
+
+        def ngettext_wrapper(singular, plural, number):
+            start = default_timer()
+            result = ngettext(singular, plural, number)
+            self.record(None, singular, plural, result, default_timer() - start)
+            return result
+
+        def npgettext_wrapper(context, singular, plural, number):
+            start = default_timer()
+            result = npgettext(context, singular, plural, number)
+            self.record(context, singular, plural, result, default_timer() - start)
+            return result
+
+        env_globals['_'] = env_globals['gettext'] = gettext_wrapper
+        env_globals['pgettext'] = pgettext_wrapper
+        env_globals['ngettext'] = ngettext_wrapper
+        env_globals['npgettext'] = npgettext_wrapper
+        environment.translation_stats = self
+        return self
+
+    def record(self, context, msgid, plural, result, seconds):
+        """
+        Records one lookup of `msgid` in the active language.
+        """
+        # get_language() returns None after translation.deactivate_all()
+        key = (get_language() or '', context, msgid, plural)
+        fallback = result == msgid or (plural is not None and result == plural)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [0, 0, 0.0]
+            entry[0] += 1
+            entry[1] += fallback
+            entry[2] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._entries = {}
+
+    def as_dict(self):
+        """
+        Returns the statistics as a dict that maps every language to its
+        totals and to a list of its msgids, the most looked up first::
+
+            {
+                'de': {
+                    'lookups': 12, 'fallbacks': 2, 'seconds': 0.0001,
+                    'msgids': [
+                        {'msgid': 'Hello', 'context': None, 'plural': None,
+                         'lookups': 10, 'fallbacks': 0, 'seconds': 0.00008},
+                        ...
+                    ],
+                },
+            }
+        """
+        with self._lock:
+            entries = [(key, list(entry)) for key, entry in self._entries.items()]
+
+        languages = {}
+        for (language, context, msgid, plural), (lookups, fallbacks, seconds) in entries:
+            stats = languages.get(language)
+            if stats is None:
+                stats = languages[language] = {
+                    'lookups': 0, 'fallbacks': 0, 'seconds': 0.0, 'msgids': [],
+                }
+            stats['lookups'] += lookups
+            stats['fallbacks'] += fallbacks
+            stats['seconds'] += seconds
+            stats['msgids'].append({
+                'msgid': msgid,
+                'context': context,
+                'plural': plural,
+                'lookups': lookups,
+                'fallbacks': fallbacks,
+                'seconds': seconds,
+            })
+        for stats in languages.values():
+            stats['msgids'].sort(key=lambda item: (-item['lookups'], item['msgid']))
+        return languages
+
+    def missing(self, language=None):
+        """
+        Returns the ``(context, msgid, plural)`` of all lookups that fell
+        back to the source string, optionally only those of `language`.
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[1]]
+        return sorted(
+            set(key[1:] for key in keys if language is None or key[0] == language),
+            key=lambda key: (key[1], key[0] or '', key[2] or '')
+        )
+
+    def dump(self, fp, **kwargs):
+        """
+        Writes :meth:`as_dict` as JSON to the file-like object `fp`, `kwargs`
+        are passed on to `json.dump`.
+        """
+        kwargs.setdefault('indent', 2)
+        kwargs.setdefault('sort_keys', True)
+        json.dump(self.as_dict(), fp, **kwargs)
@@ -0,0 +1,86 @@
+"""
+Reverse backends for the `{% url %}` tag.
+
+`jdj_tags.extensions.DjangoUrl` reverses urls with the backend in the
+environment's `url_reverse_backend` attribute and with django's ``reverse()``
+if it's ``None``::
+
+    from jdj_tags.urlresolvers import CachedReverse
+
+    env.url_reverse_backend = CachedReverse()
+
+A backend implements ``reverse(name, args, kwargs)``, which gets the view
+name, a tuple and a dict and returns the url or raises ``NoReverseMatch``,
+and ``clear()``, which drops everything it has cached. Subclasses of
+:class:`ReverseBackend` are registered for the ``URLS`` topic of
+`jdj_tags.invalidation` and cleared when the urls change.
+"""
+from __future__ import unicode_literals
+
+from django.utils.translation import get_language
+
+from jdj_tags import extensions, invalidation
+
+try:
+    from django.urls import get_script_prefix, get_urlconf
+except ImportError:  # Django < 1.10
+    from django.core.urlresolvers import get_script_prefix, get_urlconf
+
+
+class ReverseBackend(object):
+    """
+    Base class of the reverse backends.
+    """
+    def __init__(self):
+        invalidation.register(self, invalidation.URLS)
+
+    def reverse(self, name, args, kwargs):
+        raise NotImplementedError  # pragma: no cover
+
+    def clear(self):
+        pass
+
+
+class DjangoReverse(ReverseBackend):
+    """
+    Reverses every url with django's ``reverse()``, as the tag does without
+    a backend.
+    """
+    def reverse(self, name, args, kwargs):
+        return extensions.reverse(name, args=args, kwargs=kwargs)
+
+
+class CachedReverse(DjangoReverse):
+    """
+    Remembers the reversed urls across renders and threads, keyed by the
+    arguments and their types, the active urlconf, script prefix and
+    language, which ``i18n_patterns()`` puts into the url. Once `maxsize` urls
+    are cached the cache starts over, which keeps lookups a single dict
+    access. Arguments that can't be hashed are reversed every time.
+
+    Failed lookups aren't cached, so a ``NoReverseMatch`` is raised again
+    on every render.
+    """
+    def __init__(self, maxsize=10000):
+        super(CachedReverse, self).__init__()
+        self.maxsize = maxsize
+        self.urls = {}
+
+    def reverse(self, name, args, kwargs):
+        try:
+            key = (get_urlconf(), get_script_prefix(), get_language(),
+                   extensions._url_key(name, args, kwargs))
+            return self.urls[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable argument
+            return super(CachedReverse, self).reverse(name, args, kwargs)
+        url = super(CachedReverse, self).reverse(name, args, kwargs)
+        if len(self.urls) >= self.maxsize:
+            self.urls = {}
+        self.urls[key] = url
+        return url
+
+    def clear(self):
+        self.urls = {}
@@ -1,22 +1,76 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import array
 import datetime
-
+import decimal
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import timeit
+import warnings
+
+from django.conf.urls.i18n import i18n_patterns
+from django.templatetags.static import static as django_static
 from django.test import SimpleTestCase, override_settings
 from django.test.utils import requires_tz_support
 from django.utils import timezone, translation
-from jinja2 import Environment, TemplateSyntaxError
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache, TemplateSyntaxError
 from jinja2.ext import Extension
+from markupsafe import Markup
 
+from jdj_tags import invalidation, msgids, prefork
+from jdj_tags.backend import Jinja2
 from jdj_tags.extensions import (DjangoCompat, DjangoCsrf, DjangoI18n, DjangoL10n, DjangoNow,
                                  DjangoStatic, DjangoUrl)
+from jdj_tags.profiler import Profiler
+from jdj_tags.profiler import main as profiler_main
+from jdj_tags.staticfiles import CachedStatic, PrefixStatic
+from jdj_tags.stats import TranslationStats
+from jdj_tags.urlresolvers import CachedReverse
+
+try:
+    from StringIO import StringIO
+except ImportError:  # Python 3
+    from io import StringIO
 
 try:
     from unittest import mock
 except ImportError:
     import mock
 
+try:
+    from django.urls import re_path as url
+except ImportError:
+    from django.conf.urls import url
+
+try:
+    from django.urls import set_script_prefix
+except ImportError:
+    from django.core.urlresolvers import set_script_prefix
+
+
+def dummy_view(request, *args, **kwargs):
+    pass  # pragma: no cover
+
+
+urlpatterns = [
+    url(r'^$', dummy_view, name='home'),
+    url(r'^item/(?P<pk>\d+)/$', dummy_view, name='item'),
+    url(r'^page/(\d+)/(\d+)/$', dummy_view, name='page'),
+    url(r'^value/([^/]+)/$', dummy_view, name='value'),
+    url(r'^values/(?P<a>[^/]+)/(?P<b>[^/]+)/$', dummy_view, name='values'),
+]
+
+
+def setUpModule():
+    # i18n_patterns() reads the settings, which are configured in __main__
+    urlpatterns.extend(i18n_patterns(
+        url(r'^welcome/$', dummy_view, name='welcome'),
+    ))
+
 
 class DjangoCsrfTest(SimpleTestCase):
     def setUp(self):
@@ -151,6 +205,25 @@ class DjangoI18nBlocktransTest(DjangoI18nTestBase):
         self.assertEqual('alt translated', template2.render())
         self.pgettext.assert_called_with('foo', 'Translate me!')
 
+    def test_without_vars(self):
+        source = "{% blocktrans %}Translate me!{% endblocktrans %}"
+
+        self.assertNotIn("resolve('_django_blocktrans')", self.env.compile(source, raw=True))
+        self.assertIn("resolve('_django_blocktrans')", self.env.compile(
+            "{% blocktrans %}Translate {{ me }}!{% endblocktrans %}", raw=True
+        ))
+
+    def test_percent(self):
+        template1 = self.env.from_string('{% blocktrans %}100%% sure{% endblocktrans %}')
+        template2 = self.env.from_string(
+            '{% blocktrans with foo=bar %}{{ foo }}%% sure{% endblocktrans %}'
+        )
+
+        self.assertEqual('100% sure - translated', template1.render())
+        self.gettext.assert_called_with('100%% sure')
+        self.assertEqual('100% sure - translated', template2.render({'bar': 100}))
+        self.gettext.assert_called_with('%(foo)s%% sure')
+
     def test_trimmed(self):
         template = self.env.from_string("""{% blocktrans trimmed %}
                 Translate
@@ -276,13 +349,21 @@ class DjangoI18nBlocktransTest(DjangoI18nTestBase):
 
         self.assertEqual('finalized 123 - translated', template.render({'foo': 123}))
 
+    def test_finalize_overlay(self):
+        overlay = self.env.overlay(finalize=lambda value: 'finalized' if value == 3 else value)
+        template = overlay.from_string("{% blocktrans %}x {{ n }}{% endblocktrans %}")
+
+        self.assertEqual('x finalized - translated', template.render({'n': 3}))
+
     def test_errors(self):
         template1 = "{% blocktrans %}foo{% plural %}bar{% endblocktrans %}"
         template2 = "{% blocktrans count counter=10 %}foo{% endblocktrans %}"
+        template3 = "{% blocktrans %}foo {{ bar }}"
 
         error_messages = [
             (template1, 'used plural without specifying count'),
             (template2, 'plural form not found'),
+            (template3, 'unexpected end of template, expected endblocktrans tag'),
         ]
 
         for template, msg in error_messages:
@@ -290,6 +371,53 @@ class DjangoI18nBlocktransTest(DjangoI18nTestBase):
                 self.env.from_string(template)
 
 
+class TranslationStatsTest(DjangoI18nTestBase):
+    def setUp(self):
+        super(TranslationStatsTest, self).setUp()
+        self.stats = TranslationStats().install(self.env)
+
+    def test_lookups(self):
+        self.gettext.side_effect = lambda message: message if message == 'Missing' else 'x'
+        template = self.env.from_string(
+            "{% trans 'Hello' %}{% trans 'Hello' context 'greeting' %}"
+            "{% blocktrans %}Hello{% endblocktrans %}{{ _('Missing') }}"
+            "{% blocktrans count counter=2 %}item{% plural %}items{% endblocktrans %}"
+        )
+        with translation.override('de'):
+            template.render()
+        with translation.override('fr'):
+            template.render()
+
+        self.assertIs(self.stats, self.env.translation_stats)
+        stats = self.stats.as_dict()
+        self.assertEqual(['de', 'fr'], sorted(stats))
+        self.assertEqual(5, stats['de']['lookups'])
+        self.assertEqual(1, stats['de']['fallbacks'])
+        self.assertEqual(
+            [('Hello', None, None, 2, 0), ('Hello', 'greeting', None, 1, 0),
+             ('Missing', None, None, 1, 1), ('item', None, 'items', 1, 0)],
+            [
+                (item['msgid'], item['context'], item['plural'], item['lookups'],
+                 item['fallbacks'])
+                for item in stats['de']['msgids']
+            ]
+        )
+        self.assertEqual([(None, 'Missing', None)], self.stats.missing('fr'))
+
+    def test_dump(self):
+        with translation.override('de'):
+            self.env.from_string("{{ ngettext('a', 'b', 1) }}").render()
+        fp = StringIO()
+        self.stats.dump(fp)
+
+        stats = json.loads(fp.getvalue())
+        self.assertEqual(1, stats['de']['lookups'])
+        self.assertEqual('a', stats['de']['msgids'][0]['msgid'])
+
+        self.stats.reset()
+        self.assertEqual({}, self.stats.as_dict())
+
+
 @override_settings(USE_L10N=True, USE_TZ=True)
 class DjangoL10nTest(SimpleTestCase):
     @requires_tz_support
@@ -319,6 +447,56 @@ class DjangoL10nTest(SimpleTestCase):
         timezone.activate('America/Argentina/Buenos_Aires')
         self.assertEqual('1. Oktober 2000 11:10', template.render(context2))
 
+    @requires_tz_support
+    def test_localize_many(self):
+        env = Environment(extensions=[DjangoL10n])
+        template1 = env.from_string("{% for v in values %}{{ v }}|{% endfor %}")
+        template2 = env.from_string("{% for v in values|localize_many %}{{ v }}|{% endfor %}")
+        template3 = env.from_string("{% for v in localize_many(values) %}{{ v }}|{% endfor %}")
+        values = [
+            1.23, 1234567, decimal.Decimal('-1234.5'), True, 'string', None,
+            datetime.datetime(2000, 10, 1, 14, 10, 12, tzinfo=timezone.utc),
+            datetime.datetime(2000, 10, 1, 14, 10, 12),
+            datetime.date(2000, 10, 1), datetime.time(14, 10),
+        ]
+
+        translation.activate('de')
+        timezone.activate('America/Argentina/Buenos_Aires')
+        for thousand_separator in (False, True):
+            with self.settings(USE_THOUSAND_SEPARATOR=thousand_separator):
+                expected = template1.render({'values': values})
+                self.assertIn('1. Oktober 2000 11:10', expected)
+                self.assertEqual(expected, template2.render({'values': values}))
+                self.assertEqual(expected, template3.render({'values': values}))
+
+        with self.settings(USE_L10N=False, USE_TZ=False):
+            self.assertEqual(
+                '1.23|1234567|-1234.5|True|string|None|',
+                template2.render({'values': values[:6]})
+            )
+
+    def test_localize_many_render_state(self):
+        env = Environment(extensions=[DjangoL10n])
+        template = env.from_string(
+            "{{ values|localize_many|join(' ') }} {{ localize_many(values)|join(' ') }}"
+        )
+        patcher = mock.patch(
+            'jdj_tags.extensions.get_current_timezone', return_value=timezone.utc
+        )
+        get_current_timezone = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        translation.activate('de')
+        self.assertEqual('1,5 1,5', template.render({'values': [1.5]}))
+        self.assertEqual(1, get_current_timezone.call_count)
+
+    def test_localize_many_array(self):
+        env = Environment(extensions=[DjangoL10n])
+        template = env.from_string("{{ values|localize_many|join(' ') }}")
+
+        translation.activate('de')
+        self.assertEqual('1,5 2,25', template.render({'values': array.array('d', [1.5, 2.25])}))
+
     def test_existing_finalize(self):
         finalize_mock = mock.Mock(side_effect=lambda s: s)
 
@@ -352,6 +530,12 @@ class DjangoStaticTest(SimpleTestCase):
         self.assertEqual('Static: static.png', template.render())
         self.static.assert_called_with('static.png')
 
+    def test_compiled_call(self):
+        source = self.env.compile("{% static 'static.png' %}", raw=True)
+
+        self.assertIn("resolve('_django_static')", source)
+        self.assertNotIn('environment.extensions', source)
+
     def test_as_var(self):
         template = self.env.from_string(
             "{% static 'static.png' as my_url %}My url is: {{ my_url }}!"
@@ -360,6 +544,52 @@ class DjangoStaticTest(SimpleTestCase):
         self.assertEqual('My url is: Static: static.png!', template.render())
         self.static.assert_called_with('static.png')
 
+    def test_static_backend(self):
+        backend = mock.Mock()
+        backend.url.return_value = '/stub/'
+        self.env.static_backend = backend
+        template = self.env.from_string("{% static 'static.png' %}")
+
+        self.assertEqual('/stub/', template.render())
+        backend.url.assert_called_once_with('static.png')
+        self.assertFalse(self.static.called)
+
+    def test_static_backend_overlay(self):
+        backend = mock.Mock()
+        backend.url.return_value = '/stub/'
+        overlay = self.env.overlay()
+        overlay.static_backend = backend
+
+        self.assertEqual('/stub/', overlay.from_string("{% static 'a.png' %}").render())
+        self.assertEqual('Static: a.png', self.env.from_string("{% static 'a.png' %}").render())
+
+    def test_cached_static(self):
+        self.env.static_backend = CachedStatic(hosts=['https://a.example/', 'https://b.example'])
+        template = self.env.from_string("{% static 'a.css' %} {% static 'app.js' %}")
+        self.static.side_effect = lambda path: '/static/' + path
+
+        self.assertEqual('https://b.example/static/a.css https://a.example/static/app.js',
+                         template.render())
+        self.assertEqual(template.render(), template.render())
+        self.assertEqual(2, self.static.call_count)
+
+        invalidation.invalidate(invalidation.STATIC)
+        self.static.side_effect = lambda path: 'https://cdn.example/' + path
+        self.assertEqual('https://cdn.example/a.css https://cdn.example/app.js',
+                         template.render())
+        self.assertEqual(4, self.static.call_count)
+
+    @override_settings(STATIC_URL='/static/')
+    def test_prefix_static(self):
+        backend = PrefixStatic()
+
+        for path in ['a.css', 'dir/a b.css', '/abs.css', 'ü.png']:
+            self.assertEqual(django_static(path), backend.url(path))
+        self.assertFalse(self.static.called)
+
+        with override_settings(STATIC_URL='/other/'):
+            self.assertEqual('/other/a.css', backend.url('a.css'))
+
 
 class DjangoNowTest(SimpleTestCase):
     @staticmethod
@@ -370,6 +600,7 @@ class DjangoNowTest(SimpleTestCase):
         patcher = mock.patch('jdj_tags.extensions.datetime')
         dt_mock = patcher.start()
         dt_mock.now.configure_mock(side_effect=self._now)
+        self.now = dt_mock.now
         self.addCleanup(patcher.stop)
 
         self.env = Environment(extensions=[DjangoNow])
@@ -388,6 +619,42 @@ class DjangoNowTest(SimpleTestCase):
 
         self.assertEqual(expected, template.render())
 
+    @override_settings(USE_TZ=True)
+    def test_render_state(self):
+        env = Environment(extensions=[DjangoNow], loader=DictLoader({
+            'base.html': "{% now 'Y' %} {% for i in range(3) %}{% now 'Y' %} {% endfor %}"
+                         "{% include 'include.html' %}",
+            'include.html': "{% now 'Y' %}",
+        }))
+        patcher = mock.patch(
+            'jdj_tags.extensions.get_current_timezone', return_value=timezone.utc
+        )
+        get_current_timezone = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        template = env.get_template('base.html')
+
+        self.assertEqual('2015 2015 2015 2015 2015', template.render())
+        self.assertEqual(1, get_current_timezone.call_count)
+        template.render()
+        self.assertEqual(2, get_current_timezone.call_count)
+
+    @override_settings(USE_TZ=True)
+    def test_render_state_imported_macro(self):
+        env = Environment(extensions=[DjangoNow], loader=DictLoader({
+            'macros.html': "{% macro year() %}{% now 'Y' %}{% endmacro %}",
+            'base.html': "{% from 'macros.html' import year %}{{ year() }}",
+        }))
+        template = env.get_template('base.html')
+
+        with timezone.override('UTC'):
+            template.render()
+        self.assertEqual('UTC', str(self.now.call_args[1]['tz']))
+        # jinja keeps the macro's module, its snapshot is taken again
+        with timezone.override('Europe/Berlin'):
+            template.render()
+        self.assertEqual('Europe/Berlin', str(self.now.call_args[1]['tz']))
+
 
 class DjangoUrlTest(SimpleTestCase):
     @staticmethod
@@ -470,6 +737,118 @@ class DjangoUrlTest(SimpleTestCase):
         self.assertEqual(expected, template3.render({'arg1': 'foo'}))
         self.reverse.assert_called_with('my_view', args=(), kwargs={'kw1': 'foo', 'kw2': 'bar'})
 
+    def test_helper_parameter_names(self):
+        template = self.env.from_string("{% url 'my_view' name='foo' context='bar' %}")
+
+        self.assertEqual('Url for: my_view', template.render())
+        self.reverse.assert_called_with(
+            'my_view', args=(), kwargs={'name': 'foo', 'context': 'bar'}
+        )
+
+    def test_render_cache(self):
+        env = Environment(extensions=[DjangoUrl], loader=DictLoader({
+            'base.html': "{% for i in range(3) %}{% url 'my_view' 'foo' %}{% endfor %}"
+                         "{% include 'include.html' %}{% url 'my_view' [] %}{% url 'my_view' [] %}",
+            'include.html': "{% url 'my_view' 'foo' %}{% url 'my_view' kw='foo' %}",
+        }))
+        template = env.get_template('base.html')
+
+        template.render()
+        self.assertEqual(4, self.reverse.call_count)
+        template.render()
+        self.assertEqual(8, self.reverse.call_count)
+
+        self.reverse.reset_mock()
+        env.render_url_cache = False
+        template.render()
+        self.assertEqual(7, self.reverse.call_count)
+
+    def test_render_cache_sibling_includes(self):
+        # the including template has no tags of its own
+        env = Environment(extensions=[DjangoUrl], loader=DictLoader({
+            'base.html': "{% for i in range(3) %}{% include 'partial.html' %}{% endfor %}"
+                         "{% include 'partial.html' %}",
+            'partial.html': "{% url 'home' %}",
+        }))
+
+        env.get_template('base.html').render()
+        self.assertEqual(1, self.reverse.call_count)
+
+    def test_render_cache_argument_types(self):
+        self.reverse.side_effect = lambda name, args, kwargs: '/{}/{}/'.format(name, *args)
+        template = self.env.from_string(
+            "{% url 'v' 1 %} {% url 'v' True %} {% url 'v' 1.0 %} {% url 'v' 1 %}"
+        )
+
+        self.assertEqual('/v/1/ /v/True/ /v/1.0/ /v/1/', template.render())
+        self.assertEqual(3, self.reverse.call_count)
+
+    def test_render_cache_imported_macro(self):
+        env = Environment(extensions=[DjangoUrl], loader=DictLoader({
+            'macros.html': "{% macro link() %}{% url 'my_view' 'foo' %}{% endmacro %}",
+            'layout.html': "{% block content %}{% endblock %}{% url 'my_view' 'foo' %}",
+            'child.html': "{% extends 'layout.html' %}{% from 'macros.html' import link %}"
+                          "{% block content %}{{ link() }}{% url 'my_view' 'foo' %}{% endblock %}",
+        }))
+        template = env.get_template('child.html')
+
+        self.assertEqual('Url for: my_viewUrl for: my_viewUrl for: my_view', template.render())
+        self.assertEqual(2, self.reverse.call_count)
+        # the macro's module is kept by jinja, its state isn't
+        template.render()
+        self.assertEqual(4, self.reverse.call_count)
+
+    def test_reverse_backend(self):
+        backend = mock.Mock()
+        backend.reverse.return_value = '/stub/'
+        self.env.url_reverse_backend = backend
+        template = self.env.from_string("{% url 'my_view' 'foo' %}{% url 'my_view' kw=1 %}")
+
+        self.assertEqual('/stub//stub/', template.render())
+        self.assertEqual([
+            mock.call('my_view', ('foo',), {}),
+            mock.call('my_view', (), {'kw': 1}),
+        ], backend.reverse.call_args_list)
+        self.assertFalse(self.reverse.called)
+
+    def test_reverse_backend_overlay(self):
+        backend = mock.Mock()
+        backend.reverse.return_value = '/stub/'
+        overlay = self.env.overlay()
+        overlay.url_reverse_backend = backend
+
+        self.assertEqual('/stub/', overlay.from_string("{% url 'my_view' %}").render())
+        self.assertEqual('Url for: my_view', self.env.from_string("{% url 'my_view' %}").render())
+
+    def test_cached_reverse(self):
+        backend = CachedReverse(maxsize=2)
+        self.env.url_reverse_backend = backend
+        template = self.env.from_string(
+            "{% url 'my_view' 'foo' %}{% url 'my_view' kw=1 %}{% url 'my_view' [] %}"
+        )
+
+        template.render()
+        template.render()
+        self.assertEqual(4, self.reverse.call_count)
+
+        with mock.patch('jdj_tags.urlresolvers.get_script_prefix', return_value='/other/'):
+            template.render()
+        self.assertEqual(7, self.reverse.call_count)
+        self.assertEqual(2, len(backend.urls))
+
+        invalidation.invalidate(invalidation.URLS)
+        self.assertEqual({}, backend.urls)
+
+    def test_cached_reverse_argument_types(self):
+        self.reverse.side_effect = lambda name, args, kwargs: '/{}/{}/'.format(name, *args)
+        self.env.url_reverse_backend = CachedReverse()
+        self.env.render_url_cache = False
+        template = self.env.from_string("{% url 'v' 1 %} {% url 'v' True %} {% url 'v' 1.0 %}")
+
+        self.assertEqual('/v/1/ /v/True/ /v/1.0/', template.render())
+        self.assertEqual('/v/1/ /v/True/ /v/1.0/', template.render())
+        self.assertEqual(3, self.reverse.call_count)
+
     def test_errors(self):
         template = "{% url 'my_view' kw1='foo' 123 %}"
         msg = "got 'integer', expected name for keyword argument"
@@ -478,6 +857,519 @@ class DjangoUrlTest(SimpleTestCase):
             self.env.from_string(template)
 
 
+@override_settings(ROOT_URLCONF=__name__)
+class DjangoUrlStrictTest(SimpleTestCase):
+    def setUp(self):
+        self.env = Environment(extensions=[DjangoUrl])
+        self.env.strict_urls = True
+
+    def test_not_strict(self):
+        self.env.strict_urls = False
+        template = self.env.from_string("{% url 'does_not_exist' 1 2 3 %}")
+
+        self.assertIsNotNone(template)
+
+    def test_valid(self):
+        template = self.env.from_string(
+            "{% url 'home' %} {% url 'item' 12 %} {% url 'item' pk=34 %} {% url 'page' 5 6 %}"
+        )
+
+        self.assertEqual('/ /item/12/ /item/34/ /page/5/6/', template.render())
+
+    def test_errors(self):
+        error_messages = [
+            ("{% url 'does_not_exist' %}", "no url pattern named 'does_not_exist'"),
+            ("{% url 'ns:home' %}", "'ns' is not a registered namespace"),
+            ("{% url 'home' 1 %}", "url 'home' doesn't take 1 arguments"),
+            ("{% url 'item' %}", "url 'item' doesn't take the keyword arguments (none)"),
+            ("{% url 'item' id=1 %}", "url 'item' doesn't take the keyword arguments id"),
+            ("{% url 'page' 5 %}", "url 'page' doesn't take 1 arguments"),
+        ]
+
+        for template, msg in error_messages:
+            with self.assertRaisesMessage(TemplateSyntaxError, msg):
+                self.env.from_string(template)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class CachedReverseTest(SimpleTestCase):
+    def setUp(self):
+        self.env = Environment(extensions=[DjangoUrl])
+        self.env.url_reverse_backend = CachedReverse()
+
+    def test_language(self):
+        template = self.env.from_string("{% url 'welcome' %}")
+
+        with translation.override('en'):
+            self.assertEqual('/en/welcome/', template.render())
+        with translation.override('de'):
+            self.assertEqual('/de/welcome/', template.render())
+
+
+class PreforkTest(SimpleTestCase):
+    templates = {
+        'static.html': "{% static 'a.css' %}",
+        'url.html': "{% url 'my_view' 'foo' %}{% url 'my_view' kw=1 %}{% url 'my_view' arg %}"
+                    "{% url 'my_view' kw=True %}{% url 'my_view' [] %}{% url 'my_view' 'foo' %}",
+    }
+
+    def setUp(self):
+        static_patcher = mock.patch(
+            'jdj_tags.extensions.django_static', side_effect=lambda path: '/static/' + path
+        )
+        reverse_patcher = mock.patch(
+            'jdj_tags.extensions.reverse', side_effect=lambda name, args, kwargs: '/' + name
+        )
+        self.static = static_patcher.start()
+        self.reverse = reverse_patcher.start()
+        self.addCleanup(static_patcher.stop)
+        self.addCleanup(reverse_patcher.stop)
+
+        self.env = Environment(
+            extensions=[DjangoStatic, DjangoUrl], loader=DictLoader(self.templates)
+        )
+
+    def test_collect_constants(self):
+        static_paths, urls = prefork.collect_constants(self.env)
+
+        self.assertEqual({'a.css'}, static_paths)
+        self.assertEqual([
+            ('my_view', (), {'kw': 1}),
+            ('my_view', (), {'kw': True}),
+            ('my_view', ('foo',), {}),
+        ], sorted(urls, key=lambda url: (url[1], repr(url[2]))))
+
+    def test_warm_up(self):
+        table = prefork.warm_up(self.env)
+
+        self.assertIs(table, self.env.precomputed_urls)
+        self.assertEqual({'a.css': '/static/a.css'}, table.static_urls)
+        self.assertEqual(3, len(table.urls))
+        self.assertEqual('/my_view', table.reverse('my_view', ('foo',), {}))
+        self.assertIsNone(table.reverse('my_view', ('bar',), {}))
+
+        self.static.reset_mock()
+        self.reverse.reset_mock()
+        template = self.env.from_string("{% static 'a.css' %} {% static 'b.css' %}")
+        self.assertEqual('/static/a.css /static/b.css', template.render())
+        self.static.assert_called_once_with('b.css')
+
+        template = self.env.get_template('url.html')
+        self.assertEqual('/my_view' * 6, template.render({'arg': 'bar'}))
+        self.assertEqual([
+            mock.call('my_view', args=('bar',), kwargs={}),
+            mock.call('my_view', args=([],), kwargs={}),
+        ], self.reverse.call_args_list)
+
+    def test_warm_up_argument_types(self):
+        self.reverse.side_effect = lambda name, args, kwargs: '/{}/{}/'.format(name, *args)
+        env = Environment(extensions=[DjangoUrl], loader=DictLoader({
+            'types.html': "{% url 'v' 1 %} {% url 'v' True %} {% url 'v' 1.0 %}",
+        }))
+        prefork.warm_up(env)
+        self.reverse.reset_mock()
+
+        self.assertEqual('/v/1/ /v/True/ /v/1.0/', env.get_template('types.html').render())
+        self.assertFalse(self.reverse.called)
+
+    def test_warm_up_other_script_prefix(self):
+        prefork.warm_up(self.env)
+        self.static.reset_mock()
+
+        with mock.patch('jdj_tags.prefork.get_script_prefix', return_value='/other/'):
+            self.env.get_template('static.html').render()
+        self.static.assert_called_once_with('a.css')
+
+    def test_warm_up_other_language(self):
+        with translation.override('en'):
+            table = prefork.warm_up(self.env)
+            self.assertEqual('/my_view', table.reverse('my_view', ('foo',), {}))
+        with translation.override('de'):
+            self.assertIsNone(table.reverse('my_view', ('foo',), {}))
+
+    def test_warm_up_small_cache(self):
+        env = Environment(
+            extensions=[DjangoStatic, DjangoUrl], loader=DictLoader(self.templates), cache_size=1
+        )
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('ignore')
+            warnings.simplefilter('always', RuntimeWarning)
+            prefork.warm_up(env)
+            prefork.warm_up(self.env)
+        self.assertEqual(1, len(caught))
+        self.assertIn('holds 1 of the 2 templates', str(caught[0].message))
+
+    def test_invalidation(self):
+        table = prefork.warm_up(self.env)
+
+        with override_settings(STATIC_URL='/other/'):
+            self.assertEqual({}, table.static_urls)
+            self.assertEqual({}, table.urls)
+
+    def test_memory_report(self):
+        report = prefork.memory_report(self.env, workers=4)
+
+        self.assertEqual(2, report['templates'])
+        self.assertEqual(1, report['static_urls'])
+        self.assertEqual(3, report['urls'])
+        self.assertEqual(report['bytes_per_worker'] * 3, report['max_bytes_saved'])
+        # the environment isn't warmed up, a second report measures the same
+        self.assertIsNone(self.env.precomputed_urls)
+        self.assertEqual(0, len(self.env.cache))
+        second = prefork.memory_report(self.env, workers=4)
+        self.assertGreater(second['bytes_per_worker'], report['bytes_per_worker'] / 4)
+
+
+class InvalidationTest(SimpleTestCase):
+    def test_invalidate(self):
+        urls = invalidation.Cache(invalidation.URLS)
+        static = invalidation.Cache(invalidation.STATIC)
+        urls['foo'] = static['foo'] = 'bar'
+
+        invalidation.invalidate(invalidation.URLS)
+        self.assertEqual({}, urls)
+        self.assertEqual({'foo': 'bar'}, static)
+
+        invalidation.invalidate()
+        self.assertEqual({}, static)
+
+    def test_setting_changed(self):
+        urls = invalidation.Cache(invalidation.URLS)
+        translations = invalidation.Cache(invalidation.TRANSLATIONS)
+
+        urls['foo'] = translations['foo'] = 'bar'
+        with override_settings(ROOT_URLCONF=__name__):
+            self.assertEqual({}, urls)
+            self.assertEqual({'foo': 'bar'}, translations)
+
+        urls['foo'] = 'bar'
+        with override_settings(LANGUAGE_CODE='de', DATE_FORMAT='Y'):
+            self.assertEqual({'foo': 'bar'}, urls)
+            self.assertEqual({}, translations)
+
+    def test_unknown_topic(self):
+        with self.assertRaisesMessage(ValueError, "unknown topic 'foo'"):
+            invalidation.Cache('foo')
+
+
+class Jinja2BackendTest(SimpleTestCase):
+    @staticmethod
+    def make_backend(**options):
+        return Jinja2({
+            'NAME': 'jinja2',
+            'DIRS': [],
+            'APP_DIRS': False,
+            'OPTIONS': options,
+        })
+
+    def test_defaults(self):
+        backend = self.make_backend()
+
+        self.assertIn('jdj_tags.extensions.DjangoCompat', backend.env.extensions)
+        self.assertIsNone(backend.env.bytecode_cache)
+        self.assertFalse(backend.env.auto_reload)
+        self.assertFalse(backend.env.strict_urls)
+
+    @override_settings(DEBUG=True)
+    def test_debug(self):
+        backend = self.make_backend()
+
+        self.assertTrue(backend.env.auto_reload)
+
+    def test_bytecode_cache(self):
+        backend = self.make_backend(bytecode_cache=True)
+        strict = self.make_backend(bytecode_cache=True, strict_urls=True)
+        static = self.make_backend(
+            bytecode_cache=True, extensions=['jdj_tags.extensions.DjangoStatic']
+        )
+
+        self.assertIsInstance(backend.env.bytecode_cache, FileSystemBytecodeCache)
+        patterns = [b.env.bytecode_cache.pattern for b in (backend, strict, static)]
+        self.assertEqual(3, len(set(patterns)))
+        again = self.make_backend(bytecode_cache=True)
+        self.assertEqual(patterns[0], again.env.bytecode_cache.pattern)
+
+    def test_options(self):
+        backend = self.make_backend(
+            extensions=['jdj_tags.extensions.DjangoStatic'],
+            bytecode_cache='/tmp/jdj-tests',
+            strict_urls=True,
+        )
+
+        self.assertEqual(['jdj_tags.extensions.DjangoStatic'], list(backend.env.extensions))
+        self.assertEqual('/tmp/jdj-tests', backend.env.bytecode_cache.directory)
+        self.assertTrue(backend.env.strict_urls)
+
+    def test_url_reverse_backend(self):
+        backend = self.make_backend(url_reverse_backend='jdj_tags.urlresolvers.CachedReverse')
+
+        self.assertIsInstance(backend.env.url_reverse_backend, CachedReverse)
+
+    def test_static_backend(self):
+        static_backend = CachedStatic()
+        backend = self.make_backend(static_backend=static_backend)
+
+        self.assertIs(static_backend, backend.env.static_backend)
+
+    def test_translation_stats(self):
+        backend = self.make_backend(translation_stats=True)
+
+        backend.from_string("{% trans 'Hello' %}").render()
+        self.assertEqual(1, backend.env.translation_stats.as_dict()['en-us']['lookups'])
+
+    def test_csrf_token(self):
+        backend = self.make_backend()
+        request = mock.Mock(META={'CSRF_COOKIE': 'a_csrf_token'})
+        template = backend.from_string('{% csrf_token %}')
+
+        self.assertIn('name="csrfmiddlewaretoken"', template.render(request=request))
+
+
+class MsgidsTest(SimpleTestCase):
+    templates = {
+        'a.html': "{% trans 'Monday' %}\n"
+                  "{% blocktrans trimmed %}\n  Monday\n{% endblocktrans %}\n"
+                  "{% blocktrans with a=1 context 'ctx' %}{{ a }} %% b{% endblocktrans %}\n"
+                  "{% blocktrans count n=2 %}one{% plural %}many{% endblocktrans %}\n"
+                  "{{ gettext(var) }}{{ pgettext('ctx', 'Missing') }}",
+    }
+
+    def setUp(self):
+        self.env = Environment(extensions=[DjangoI18n], loader=DictLoader(self.templates))
+
+    def test_extract(self):
+        index = msgids.extract(self.env)
+
+        self.assertEqual([
+            ('%(a)s %% b', 'ctx', None, [['a.html', 5]]),
+            ('Missing', 'ctx', None, [['a.html', 7]]),
+            ('Monday', None, None, [['a.html', 1], ['a.html', 2]]),
+            ('one', None, 'many', [['a.html', 6]]),
+        ], [
+            (entry['msgid'], entry['context'], entry['plural'], entry['locations'])
+            for entry in index
+        ])
+
+        fp = StringIO()
+        msgids.write_index(index, fp)
+        fp.seek(0)
+        self.assertEqual(index, msgids.read_index(fp))
+
+        self.assertEqual(
+            ['%(a)s %% b', 'Missing', 'one'],
+            [entry['msgid'] for entry in msgids.missing(index, 'de')]
+        )
+
+    def test_preloaded_translations(self):
+        preloaded = msgids.PreloadedTranslations(msgids.extract(self.env))
+        for autoescape in [False, True]:
+            self.env.autoescape = autoescape
+            template = self.env.get_template('a.html')
+            with translation.override('de'):
+                expected = template.render({'var': 'Tuesday'})
+            self.assertIn('Montag', expected)
+
+            env = Environment(
+                extensions=[DjangoI18n], loader=DictLoader(self.templates), autoescape=autoescape
+            )
+            self.assertIs(preloaded, preloaded.install(env))
+            with translation.override('de'):
+                self.assertEqual(expected, env.get_template('a.html').render({'var': 'Tuesday'}))
+
+        self.assertEqual(('Montag', False), preloaded.tables['de'][None, 'Monday'])
+        self.assertEqual(('Missing', True), preloaded.tables['de']['ctx', 'Missing'])
+
+        invalidation.invalidate(invalidation.TRANSLATIONS)
+        self.assertEqual({}, preloaded.tables)
+        preloaded.preload('fr')
+        self.assertEqual(['fr'], list(preloaded.tables))
+
+    def test_markup_msgid(self):
+        preloaded = msgids.PreloadedTranslations([
+            {'msgid': 'Missing', 'context': None, 'plural': None, 'locations': []},
+        ])
+        gettext = mock.Mock(side_effect=lambda message: message)
+        preloaded.gettext = gettext
+
+        with translation.override('de'):
+            self.assertEqual('Missing', preloaded.lookup(None, 'Missing', gettext, ('Missing',)))
+            self.assertEqual(1, gettext.call_count)
+            message = Markup('Missing')
+            self.assertIs(message, preloaded.lookup(None, message, gettext, (message,)))
+            self.assertEqual(2, gettext.call_count)
+
+
+class ProfilerTest(SimpleTestCase):
+    templates = {
+        'base.html': "{% for i in range(3) %}\n{% trans 'Hello' %}\n{% endfor %}\n"
+                     "{% blocktrans with a=1 %}{{ a }}{% endblocktrans %}\n"
+                     "{% include 'include.html' %}\n"
+                     "{{ _('Hi') }} {% blocktrans %}Hi{% endblocktrans %}\n"
+                     "{{ gettext('Hey') }} {% trans 'Hey' noop %}",
+        'include.html': "{% static 'a.css' %}",
+    }
+
+    def setUp(self):
+        patcher = mock.patch('jdj_tags.extensions.django_static', return_value='/static/a.css')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_profile(self):
+        env = Environment(extensions=[DjangoCompat], loader=DictLoader(self.templates))
+        profiler = Profiler(env)
+        profiler.profile(['base.html', 'missing.html'], number=2)
+
+        self.assertEqual({'base.html': 2}, {
+            name: renders for name, (renders, seconds) in profiler.templates.items()
+        })
+        self.assertEqual({
+            '{% trans %}': 8, '{% blocktrans %}': 4, '_()': 2, 'gettext()': 2,
+            '{% static %}': 2,
+        }, {
+            tag: calls for tag, (calls, seconds) in profiler.tags.items()
+        })
+        lines = set(profiler.lines)
+        self.assertTrue({('base.html', 2), ('base.html', 4), ('base.html', 5),
+                         ('include.html', 1)}.issubset(lines), lines)
+        self.assertIn('TemplateNotFound', profiler.errors['missing.html'])
+
+    def test_main(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name, source in self.templates.items():
+            with open(os.path.join(directory, name), 'w') as fp:
+                fp.write(source)
+        context_file = os.path.join(directory, 'context.json')
+        with open(context_file, 'w') as fp:
+            json.dump({'a': 1}, fp)
+
+        out = StringIO()
+        profiler = profiler_main(
+            [directory, '--context', context_file, '-n', '3', '--extension', 'html'], out
+        )
+
+        self.assertEqual({'base.html', 'include.html'}, set(profiler.templates))
+        report = out.getvalue()
+        self.assertIn('{% trans %}', report)
+        self.assertIn('base.html:2', report)
+
+
+@override_settings(ROOT_URLCONF=__name__, STATIC_URL='/static/')
+class OptimizationParityTest(SimpleTestCase):
+    """
+    Renders the same templates with all optimizations enabled and with all
+    of them disabled and checks that the output is identical. Set the
+    environment variable JDJ_TIMINGS to a number of renders per combination
+    to print the time of both modes.
+    """
+    templates = {
+        'base.html': (
+            "{% csrf_token %}\n"
+            "{% trans 'Monday' %} {% trans 'May' context 'long date' %} {{ _('Tuesday') }}\n"
+            "{% blocktrans %}Wednesday{% endblocktrans %}\n"
+            "{% blocktrans trimmed %}\n  100%% sure\n{% endblocktrans %}\n"
+            "{% blocktrans with day=day %}Day: {{ day }}{% endblocktrans %}\n"
+            "{% blocktrans count counter=items|length %}{{ counter }} item{% plural %}"
+            "{{ counter }} items{% endblocktrans %}\n"
+            "{% blocktrans context 'month name' %}May{% endblocktrans %}\n"
+            "{% for item in items %}{% url 'item' pk=item %} {% url 'page' item 2 %}\n"
+            "{% endfor %}"
+            "{% url 'home' as home %}{{ home }} {% url 'welcome' %}\n"
+            "{% url 'value' 1 %} {% url 'value' True %} {% url 'value' 1.0 %} {% url 'value' 1 %}\n"
+            "{% url 'values' a=1 b=True %} {% url 'values' a=True b=1.0 %} {% url 'value' flag %}\n"
+            "{% static 'css/site.css' %} {% static 'img/a b.png' %}\n"
+            "{{ number }} {{ decimal }} {{ date }} {{ datetime }} {{ time }}\n"
+            "{% for value in values|localize_many %}{{ value }};{% endfor %}\n"
+            "{% now 'Y T' %}\n"
+            "{% from 'macros.html' import link %}{{ link() }}\n"
+            "{% include 'include.html' %}"
+        ),
+        'macros.html': (
+            "{% macro link() %}<a href=\"{% url 'home' %}\">{% trans 'Friday' %}</a>"
+            "{% now 'Y T' %}{% endmacro %}"
+        ),
+        'include.html': "{% url 'item' pk=1 %} {% static 'css/site.css' %} {{ datetime }}",
+        'layout.html': (
+            "{% block content %}{% endblock %}\n{% url 'home' %} {% now 'Y T' %}\n"
+            "{% blocktrans count counter=1 %}{{ counter }} item{% plural %}"
+            "{{ counter }} items{% endblocktrans %}"
+        ),
+        'page.html': (
+            "{% extends 'layout.html' %}{% from 'macros.html' import link %}"
+            "{% block content %}{{ link() }} {% url 'page' 1 2 %}{{ datetime }}{% endblock %}"
+        ),
+    }
+    template_names = ['base.html', 'page.html']
+    context = {
+        'csrf_token': 'a_csrf_token',
+        'day': 'Friday',
+        'flag': True,
+        'items': [1, 2, 3],
+        'number': 1234.5,
+        'decimal': decimal.Decimal('1234.56'),
+        'date': datetime.date(2000, 10, 1),
+        'datetime': datetime.datetime(2000, 10, 1, 14, 10, 12, tzinfo=timezone.utc),
+        'time': datetime.time(14, 10, 12),
+        'values': [1234.5, decimal.Decimal('1.5'), datetime.date(2000, 10, 1), 'text'],
+    }
+
+    def make_env(self, optimized, autoescape):
+        env = Environment(
+            extensions=[DjangoCompat], loader=DictLoader(self.templates), autoescape=autoescape
+        )
+        if optimized:
+            env.strict_urls = True
+            env.url_reverse_backend = CachedReverse()
+            env.static_backend = CachedStatic()
+            msgids.PreloadedTranslations(msgids.extract(env)).install(env)
+        else:
+            env.render_url_cache = False
+        return env
+
+    def test_parity(self):
+        number = int(os.environ.get('JDJ_TIMINGS') or 1)
+        timings = {False: 0.0, True: 0.0}
+        self.addCleanup(set_script_prefix, '/')
+
+        for autoescape, language, tz, use_l10n, use_tz, static_url, script_prefix in \
+                itertools.product(
+                    [False, True], ['en', 'de', 'fr'], ['UTC', 'Europe/Berlin'], [False, True],
+                    [False, True], ['/static/', 'https://cdn.example/s/'], ['/', '/prefix/']
+                ):
+            output = {}
+            with translation.override(language), timezone.override(tz), \
+                    override_settings(USE_L10N=use_l10n, USE_TZ=use_tz, STATIC_URL=static_url):
+                # DjangoL10n picks its finalize from the settings when the
+                # environment is created
+                envs = {
+                    optimized: self.make_env(optimized, autoescape) for optimized in [False, True]
+                }
+                # the precomputed urls are computed for English and the
+                # script prefix "/" to test the lookups in other languages
+                # and prefixes
+                set_script_prefix('/')
+                with translation.override('en'):
+                    prefork.warm_up(envs[True])
+                set_script_prefix(script_prefix)
+                for optimized, env in envs.items():
+                    start = timeit.default_timer()
+                    for _ in range(number):
+                        output[optimized] = [
+                            env.get_template(name).render(self.context)
+                            for name in self.template_names
+                        ]
+                    timings[optimized] += timeit.default_timer() - start
+            self.assertEqual(output[False], output[True], (
+                autoescape, language, tz, use_l10n, use_tz, static_url, script_prefix
+            ))
+            if use_l10n and language == 'de':
+                self.assertIn('1234,5', output[False][0])
+
+        if os.environ.get('JDJ_TIMINGS'):
+            print('\nrendering without optimizations: {:.3f}s, with optimizations: {:.3f}s'
+                  ''.format(timings[False], timings[True]))
+
+
 class DjangoCompatTest(SimpleTestCase):
     classes = ['DjangoCsrf', 'DjangoI18n', 'DjangoStatic', 'DjangoNow', 'DjangoUrl']
 
@@ -515,6 +1407,9 @@ class DjangoCompatTest(SimpleTestCase):
             with self.assertRaisesMessage(self.CalledParse, class_name):
                 self.env.from_string('{% ' + tag + ' %}')
 
+    def test_compile_expression(self):
+        self.assertEqual(2, self.env.compile_expression('1 + 1')())
+
 
 if __name__ == '__main__':
     import unittest